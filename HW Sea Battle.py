@@ -1,5 +1,13 @@
-from random import randint
-from time import sleep
+import argparse
+import asyncio
+import sys
+from collections.abc import MutableSet
+from time import perf_counter, sleep
+
+from density import best_cell
+from fleet_placement import NEIGHBOURS, get_placer, ship_masks, use_pool
+from metrics import Metrics, NULL_METRICS, export
+from shot_pool import ShotPool
 
 
 # Размер игровой доски
@@ -23,42 +31,214 @@ class BoardWrongShipException(BoardException):
     pass
 
 class Dot():
+    # Неизменяемая точка: её можно класть в set и использовать как ключ dict
+    __slots__ = ('x', 'y', '_hash')
+
     def __init__(self, x: int, y: int) -> None:
-        self.x = x
-        self.y = y
+        object.__setattr__(self, 'x', x)
+        object.__setattr__(self, 'y', y)
+        # Хэш считается один раз, а не при каждом поиске в set/dict
+        object.__setattr__(self, '_hash', hash((x, y)))
+
+    def __setattr__(self, name: str, value: int) -> None:
+        raise AttributeError('Координаты точки нельзя изменить.')
 
     def __eq__(self, other: 'Dot') -> bool:
+        if not isinstance(other, Dot):
+            return NotImplemented
         return self.x == other.x and self.y == other.y
 
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __reduce__(self) -> tuple:
+        # copy и pickle не могут восстановить слоты через __setattr__
+        return Dot, (self.x, self.y)
+
+    def __repr__(self) -> str:
+        return f'Dot({self.x}, {self.y})'
+
 class Ship():
     def __init__(self, length: int, bow: Dot, direction: int) -> None:
         self.length = length
         self.bow = bow
         self.direction = direction
         self.lives = length
+        self._dots = None
 
     @property
-    def dots(self) -> list[Dot]:
-        dot_list = list()
-        for i in range(self.length):
-            x, y = self.bow.x, self.bow.y
-            if self.direction == 0:
-                x += i
-            elif self.direction == 1:
-                y += i
-            dot_list.append(Dot(x, y))
-        return dot_list
+    def dots(self) -> tuple[Dot, ...]:
+        # Палубы считаются один раз: положение корабля не меняется
+        if self._dots is None:
+            dot_list = list()
+            for i in range(self.length):
+                x, y = self.bow.x, self.bow.y
+                if self.direction == 0:
+                    x += i
+                elif self.direction == 1:
+                    y += i
+                dot_list.append(Dot(x, y))
+            self._dots = tuple(dot_list)
+        return self._dots
 
     def is_strike(self, dot: Dot) -> bool:
         return dot in self.dots
 
+class EventSink():
+    # Получатель игровых событий. Базовый класс ничего не делает,
+    # поэтому подходит для безголовой игры без print и sleep.
+
+    def shot(self, dot: Dot, result: str) -> None:
+        # result - 'miss', 'hit' или 'kill'
+        pass
+
+    def ai_move(self, dot: Dot) -> None:
+        pass
+
+    def error(self, message: str) -> None:
+        pass
+
+    def turn(self, game: 'Game', player: 'Player') -> None:
+        pass
+
+    def game_over(self, game: 'Game', winner: 'Player') -> None:
+        pass
+
+class NullSink(EventSink):
+    pass
+
+class ConsoleSink(EventSink):
+    # Вывод игры в консоль с паузами, как в обычной партии
+    messages = {'miss': '\n\tМимо.',
+                'hit': '\n\tПопадание!',
+                'kill': '\n\tКорабль потоплен!'}
+
+    def shot(self, dot: Dot, result: str) -> None:
+        print(self.messages[result])
+        sleep(1)
+
+    def ai_move(self, dot: Dot) -> None:
+        print(f'x y = {dot.x + 1} {dot.y + 1}')
+        sleep(1)
+
+    def error(self, message: str) -> None:
+        print(message)
+        sleep(1)
+
+    def turn(self, game: 'Game', player: 'Player') -> None:
+        game.show_boards()
+        if player is game.user:
+            print('Ваш ход:')
+        else:
+            print('Ходит компьютер:')
+
+    def game_over(self, game: 'Game', winner: 'Player') -> None:
+        print('\n\n\n' + '-' * 50 + '\n\n\n')
+        print(self.banner(game, winner))
+        game.show_boards()
+
+    @staticmethod
+    def banner(game: 'Game', winner: 'Player') -> str:
+        if winner is game.user:
+            return '#' * 22 + '\n#    Вы выиграли!    #\n' + '#' * 22
+        return '#' * 22 + '\n# Компьютер выиграл! #\n' + '#' * 22
+
+class AnsiRenderer():
+    # Рисует обе доски целиком только в первый раз, а дальше выводит
+    # лишь изменившиеся клетки через ANSI-перемещение курсора.
+    # Раскладка экрана (строки с 1): заголовок доски пользователя,
+    # шапка из двух строк, BOARD_SIZE строк доски, пустая строка,
+    # то же для доски компьютера, строка сообщений и строка ввода.
+
+    def __init__(self) -> None:
+        self.previous = None
+
+    @staticmethod
+    def board_top(index: int) -> int:
+        # Номер экранной строки с первой строкой клеток доски
+        return 4 + index * (BOARD_SIZE + 4)
+
+    @property
+    def status_line(self) -> int:
+        return AnsiRenderer.board_top(2) - 3
+
+    @property
+    def prompt_line(self) -> int:
+        return self.status_line + 1
+
+    @staticmethod
+    def snapshot(game: 'Game') -> list[list[str]]:
+        return [[board.cell(col, row) for row in range(BOARD_SIZE)
+                 for col in range(BOARD_SIZE)]
+                for board in (game.user.own_board, game.ai.own_board)]
+
+    def frame(self, game: 'Game') -> str:
+        cells = AnsiRenderer.snapshot(game)
+        if self.previous is None:
+            parts = ['\x1b[2J\x1b[H']
+            for title, board in (('Доска пользователя:', game.user.own_board),
+                                 ('Доска компьютера:', game.ai.own_board)):
+                parts.append(title + '\n' + board.render()[:-1])
+        else:
+            parts = list()
+            prefix = len(str(BOARD_SIZE)) + 3
+            for index, (old, new) in enumerate(zip(self.previous, cells)):
+                for cell, (was, now) in enumerate(zip(old, new)):
+                    if was != now:
+                        row, col = divmod(cell, BOARD_SIZE)
+                        parts.append(f'\x1b[{AnsiRenderer.board_top(index) + row};'
+                                     f'{prefix + 2 * col + 1}H{now}')
+        self.previous = cells
+        return ''.join(parts)
+
+    def status(self, message: str) -> str:
+        return f'\x1b[{self.status_line};1H\x1b[K{message}'
+
+    def prompt(self, message: str) -> str:
+        return f'\x1b[{self.prompt_line};1H\x1b[K{message}'
+
+class AnsiSink(ConsoleSink):
+    # Консольный вывод с перерисовкой только изменившихся клеток,
+    # сообщения пишутся в одну и ту же строку экрана
+
+    def __init__(self) -> None:
+        self.renderer = AnsiRenderer()
+
+    @staticmethod
+    def write(text: str) -> None:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+    def shot(self, dot: Dot, result: str) -> None:
+        self.write(self.renderer.status(self.messages[result].strip()))
+        sleep(1)
+
+    def ai_move(self, dot: Dot) -> None:
+        self.write(self.renderer.status(f'x y = {dot.x + 1} {dot.y + 1}'))
+        sleep(1)
+
+    def error(self, message: str) -> None:
+        self.write(self.renderer.status(message.strip()))
+        sleep(1)
+
+    def turn(self, game: 'Game', player: 'Player') -> None:
+        text = 'Ваш ход: ' if player is game.user else 'Ходит компьютер:'
+        self.write(self.renderer.frame(game) + self.renderer.prompt(text))
+
+    def game_over(self, game: 'Game', winner: 'Player') -> None:
+        self.write(self.renderer.frame(game) + self.renderer.prompt('')
+                   + self.banner(game, winner) + '\n')
+
 class Board():
     _is_hidden: bool = False
     
-    def __init__(self) -> None:
+    def __init__(self, sink: EventSink = None) -> None:
+        self.sink = sink if sink is not None else ConsoleSink()
         self.table = [['○'] * BOARD_SIZE for _ in range(BOARD_SIZE)]
         self.ships = list()
-        self.locked_dots = list()
+        self.locked_dots = set()
+        # Индекс клетка -> корабль, чтобы выстрел был одним поиском в dict
+        self.ship_cells = dict()
         self.live_ships = len(SHIPS_TYPES)
 
     @property
@@ -78,7 +258,8 @@ class Board():
                 raise BoardWrongShipException()
         for dot in ship.dots:
             self.table[dot.x][dot.y] = '■'
-            self.locked_dots.append(dot)
+            self.locked_dots.add(dot)
+            self.ship_cells[dot] = ship
         self.ships.append(ship)
         self.mark_oreol(ship)
 
@@ -91,23 +272,26 @@ class Board():
                 current_dot = Dot(x, y)
                 if (not Board.out(current_dot)) and \
                    (current_dot not in self.locked_dots):
-                    self.locked_dots.append(current_dot)
+                    self.locked_dots.add(current_dot)
                     if is_game:
                         self.table[x][y] = '•'
 
-    def show(self) -> None:
-        print(' X| 1 2 3 4 5 6')
-        print('Y◢ ____________')
+    def cell(self, col: int, row: int) -> str:
+        cell = self.table[col][row]
+        return '○' if self.is_hidden and cell == '■' else cell
+
+    def render(self) -> str:
+        # Кадр доски собирается в одну строку и выводится одним вызовом
+        width = len(str(BOARD_SIZE))
+        lines = [' ' * width + 'X| ' + ' '.join(str(i + 1) for i in range(BOARD_SIZE)),
+                 'Y◢' + ' ' * width + '_' * (2 * BOARD_SIZE)]
         for row in range(BOARD_SIZE):
-            print(row + 1, end=' | ')
-            for col in range(BOARD_SIZE):
-                cell = self.table[col][row]
-                if self.is_hidden:
-                    print('○', end=' ') if cell == '■' else print(cell, end=' ')
-                else:
-                    print(cell, end=' ')
-            print('')
-        print('\n')
+            lines.append(f'{row + 1:<{width}} | ' + ''.join(
+                self.cell(col, row) + ' ' for col in range(BOARD_SIZE)))
+        return '\n'.join(lines) + '\n\n\n'
+
+    def show(self) -> None:
+        sys.stdout.write(self.render())
 
     @staticmethod
     def out(dot: Dot) -> bool:
@@ -118,37 +302,162 @@ class Board():
             raise BoardOutException
         if dot in self.locked_dots:
             raise BoardUsedException
-        self.locked_dots.append(dot)
-        for ship in self.ships:
-            if ship.is_strike(dot):
-                ship.lives -= 1
-                self.table[dot.x][dot.y] = '×'
-                if ship.lives == 0:
-                    self.live_ships -= 1
-                    self.mark_oreol(ship, is_game=True)
-                    print('\n\tКорабль потоплен!')
-                    sleep(1)
-                    return True
-                else:
-                    print('\n\tПопадание!')
-                    sleep(1)
-                    return True
+        self.locked_dots.add(dot)
+        ship = self.ship_cells.get(dot)
+        if ship is not None:
+            ship.lives -= 1
+            self.table[dot.x][dot.y] = '×'
+            if ship.lives == 0:
+                self.live_ships -= 1
+                self.mark_oreol(ship, is_game=True)
+                self.sink.shot(dot, 'kill')
+            else:
+                self.sink.shot(dot, 'hit')
+            return True
         self.table[dot.x][dot.y] = '•'
-        print('\n\tМимо.')
-        sleep(1)
+        self.sink.shot(dot, 'miss')
         return False
 
     def get_ready(self) -> None:
-        self.locked_dots = list()
+        self.locked_dots = set()
 
     def is_loser(self) -> bool:
         return self.live_ships == 0
 
+def cell_bit(x: int, y: int) -> int:
+    return 1 << (x * BOARD_SIZE + y)
+
+
+def mask_dots(mask: int) -> list[Dot]:
+    dot_list = list()
+    while mask:
+        low = mask & -mask
+        x, y = divmod(low.bit_length() - 1, BOARD_SIZE)
+        dot_list.append(Dot(x, y))
+        mask ^= low
+    return dot_list
+
+class LockedDots(MutableSet):
+    # Живое представление locked_mask доски в виде множества точек:
+    # add и discard сразу меняют маску доски
+
+    def __init__(self, board: 'BitBoard') -> None:
+        self.board = board
+
+    def __contains__(self, dot: Dot) -> bool:
+        return not Board.out(dot) and bool(self.board.locked_mask & cell_bit(dot.x, dot.y))
+
+    def __iter__(self):
+        return iter(mask_dots(self.board.locked_mask))
+
+    def __len__(self) -> int:
+        return bin(self.board.locked_mask).count('1')
+
+    def add(self, dot: Dot) -> None:
+        # У клетки вне доски нет бита в маске
+        if Board.out(dot):
+            raise BoardOutException
+        self.board.locked_mask |= cell_bit(dot.x, dot.y)
+
+    def discard(self, dot: Dot) -> None:
+        if dot in self:
+            self.board.locked_mask &= ~cell_bit(dot.x, dot.y)
+
+    def __repr__(self) -> str:
+        return f'LockedDots({set(self)!r})'
+
+class BitBoard(Board):
+    # Доска на битовых масках: клетка (x, y) - бит x * BOARD_SIZE + y.
+    # Повторяет интерфейс Board, но add_ship, mark_oreol и shot
+    # обходятся несколькими целочисленными операциями.
+
+    def __init__(self, sink: EventSink = None) -> None:
+        self.locked_mask = 0
+        super().__init__(sink)
+        self.ship_mask = 0
+        self.hit_mask = 0
+        self.shot_mask = 0
+        self.halo_mask = 0
+        self.ship_bits = list()
+        self.cell_ship = [-1] * (BOARD_SIZE * BOARD_SIZE)
+
+    @property
+    def locked_dots(self) -> LockedDots:
+        return LockedDots(self)
+
+    @locked_dots.setter
+    def locked_dots(self, dots: set[Dot]) -> None:
+        # dots может быть представлением этой же маски (после |= и т.п.)
+        mask = 0
+        for dot in dots:
+            mask |= cell_bit(dot.x, dot.y)
+        self.locked_mask = mask
+
+    def add_ship(self, ship: Ship) -> None:
+        mask, halo = ship_masks(ship.length, ship.bow.x, ship.bow.y,
+                                ship.direction, BOARD_SIZE)
+        if not mask or mask & self.locked_mask:
+            raise BoardWrongShipException()
+        index = len(self.ships)
+        for dot in mask_dots(mask):
+            self.table[dot.x][dot.y] = '■'
+            self.cell_ship[dot.x * BOARD_SIZE + dot.y] = index
+        self.ship_mask |= mask
+        self.locked_mask |= mask
+        self.ships.append(ship)
+        self.ship_bits.append(mask)
+        self.mark_oreol(ship)
+
+    def mark_oreol(self, ship: Ship, is_game: bool = False) -> None:
+        # Ореол считается по самому кораблю, как в Board: соседи каждой
+        # палубы, то есть у многопалубного корабля и сами палубы
+        mask, halo = ship_masks(ship.length, ship.bow.x, ship.bow.y,
+                                ship.direction, BOARD_SIZE)
+        if ship.length > 1:
+            halo |= mask
+        new_cells = halo & ~self.locked_mask
+        self.locked_mask |= new_cells
+        if is_game:
+            self.halo_mask |= new_cells
+            for dot in mask_dots(new_cells):
+                self.table[dot.x][dot.y] = '•'
+
+    def shot(self, dot: Dot) -> bool:
+        if Board.out(dot):
+            raise BoardOutException
+        bit = cell_bit(dot.x, dot.y)
+        if self.locked_mask & bit:
+            raise BoardUsedException
+        self.locked_mask |= bit
+        self.shot_mask |= bit
+        if self.ship_mask & bit:
+            self.hit_mask |= bit
+            ship = self.ships[self.cell_ship[dot.x * BOARD_SIZE + dot.y]]
+            ship.lives -= 1
+            self.table[dot.x][dot.y] = '×'
+            if ship.lives == 0:
+                self.live_ships -= 1
+                self.mark_oreol(ship, is_game=True)
+                self.sink.shot(dot, 'kill')
+            else:
+                self.sink.shot(dot, 'hit')
+            return True
+        self.table[dot.x][dot.y] = '•'
+        self.sink.shot(dot, 'miss')
+        return False
+
+    def get_ready(self) -> None:
+        self.locked_mask = 0
+
 class Player():
     def __init__(self, own_board: Board, opponent_board: Board) -> None:
         self.own_board = own_board
         self.opponent_board = opponent_board
 
+    @property
+    def sink(self) -> EventSink:
+        return self.own_board.sink
+
     def ask(self):
         raise NotImplementedError(f'Определите ask в {self.__class__.__name__}.')
 
@@ -157,18 +466,89 @@ class Player():
             try:
                 return self.opponent_board.shot(self.ask())
             except ValueError:
-                print('\n\tВнимательнее, вводите две цифры через пробел.\n')
-                sleep(1)
+                self.sink.error('\n\tВнимательнее, вводите две цифры через пробел.\n')
             except BoardException as e:
-                print(e)
-                sleep(1)
+                self.sink.error(str(e))
 
 class AI(Player):
+    # Долгий ли ход: такой AI сервер запускает в пуле потоков
+    slow = False
+
+    def __init__(self, own_board: Board, opponent_board: Board) -> None:
+        super().__init__(own_board, opponent_board)
+        # Ещё не обстрелянные клетки, выбор без возвращения за O(1)
+        self.untried = ShotPool((x, y) for x in range(BOARD_SIZE)
+                                for y in range(BOARD_SIZE))
+
     def ask(self) -> Dot:
-        x, y = randint(1, BOARD_SIZE), randint(1, BOARD_SIZE)
-        print(f'x y = {x} {y}')
-        sleep(1)
-        return Dot(x - 1, y - 1)
+        # Клетки, уже открытые на доске соперника (промахи и ореолы
+        # потопленных кораблей), пропускаются
+        while True:
+            x, y = self.untried.sample()
+            if self.opponent_board.table[x][y] not in ('•', '×'):
+                break
+        dot = Dot(x, y)
+        self.sink.ai_move(dot)
+        return dot
+
+    def shot_candidates(self) -> int:
+        # Из скольких клеток выбирается следующий выстрел (для метрик)
+        return len(self.untried)
+
+class DensityAI(AI):
+    # Стреляет в клетку, которую накрывает больше всего допустимых
+    # положений оставшихся кораблей; после попадания добивает корабль.
+    # Помнит свои выстрелы, поэтому не стреляет в занятые клетки.
+    slow = True
+
+    def __init__(self, own_board: Board, opponent_board: Board) -> None:
+        super().__init__(own_board, opponent_board)
+        self.remaining = list(SHIPS_TYPES)
+        # Клетки, где корабля нет: промахи, потопленные корабли и их ореолы
+        self.blocked = set()
+        # Попадания по ещё не потопленным кораблям
+        self.hits = set()
+        self.last_shot = None
+
+    def ask(self) -> Dot:
+        x, y = best_cell(BOARD_SIZE, self.blocked, self.hits, self.remaining)
+        self.last_shot = (x, y)
+        dot = Dot(x, y)
+        self.sink.ai_move(dot)
+        return dot
+
+    def shot_candidates(self) -> int:
+        # untried не используется: выбор идёт по всем клеткам вне blocked и hits
+        return BOARD_SIZE * BOARD_SIZE - len(self.blocked | self.hits)
+
+    def move(self) -> bool:
+        live_ships = self.opponent_board.live_ships
+        repeat = super().move()
+        if not repeat:
+            self.blocked.add(self.last_shot)
+        elif self.opponent_board.live_ships < live_ships:
+            self.sink_ship(self.last_shot)
+        else:
+            self.hits.add(self.last_shot)
+        return repeat
+
+    def sink_ship(self, cell: tuple[int, int]) -> None:
+        # Потопленный корабль - подбитые клетки, связанные с последним выстрелом
+        ship = {cell}
+        stack = [cell]
+        while stack:
+            x, y = stack.pop()
+            for near in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+                if near in self.hits and near not in ship:
+                    ship.add(near)
+                    stack.append(near)
+        self.hits -= ship
+        self.remaining.remove(len(ship))
+        for x, y in ship:
+            self.blocked.add((x, y))
+            for dx, dy in NEIGHBOURS:
+                if 0 <= x + dx < BOARD_SIZE and 0 <= y + dy < BOARD_SIZE:
+                    self.blocked.add((x + dx, y + dy))
 
 class User(Player):
     def ask(self) -> Dot:
@@ -180,40 +560,33 @@ class User(Player):
 
 
 class Game():
-    def __init__(self) -> None:
-        self.user_board = self.make_board()
-        self.ai_board = self.make_board()
+    def __init__(self, board_cls: type = Board, sink: EventSink = None,
+                 ai_cls: type = AI, metrics: Metrics = None) -> None:
+        self.board_cls = board_cls
+        self.sink = sink if sink is not None else ConsoleSink()
+        # Счётчики и таймеры фаз, по умолчанию выключены
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        with self.metrics.timer('setup'):
+            self.user_board = self.make_board()
+            self.ai_board = self.make_board()
         self.ai_board.is_hidden = True
         self.user = User(self.user_board, self.ai_board)
-        self.ai = AI(self.ai_board, self.user_board)
+        self.ai = ai_cls(self.ai_board, self.user_board)
 
     def make_board(self) -> Board:
-        board = None
-        while board is None:
-            board = Game.random_board()
+        board = Game.random_board(self.board_cls, self.sink, self.metrics)
         board.get_ready()
         return board
 
     @staticmethod
-    def random_board() -> Board:
-        board = Board()
-        attempts = 0
-        for length in SHIPS_TYPES:
-            while True:
-                if attempts > 2000:
-                    return None
-                try:
-                    board.add_ship(Ship(length,
-                                        Dot(randint(0, BOARD_SIZE-1),
-                                            randint(0, BOARD_SIZE-1)
-                                            ),
-                                        randint(0, 1)
-                                        )
-                                   )
-                    break
-                except BoardWrongShipException:
-                    pass
-                attempts += 1
+    def random_board(board_cls: type = Board, sink: EventSink = None,
+                     metrics: Metrics = NULL_METRICS) -> Board:
+        # Флот собирается из заранее посчитанных допустимых позиций,
+        # поэтому доска всегда получается с первого раза
+        board = board_cls(sink)
+        placer = get_placer(BOARD_SIZE, SHIPS_TYPES)
+        for length, x, y, direction in placer.place(metrics):
+            board.add_ship(Ship(length, Dot(x, y), direction))
         return board
 
     @staticmethod
@@ -246,40 +619,369 @@ class Game():
         input('\n\tНажмите -= Enter =- для старта')
 
     def show_boards(self) -> None:
-        print('\n\n\n' + '-' * 50)
-        print('Доска пользователя:\n')
-        self.user.own_board.show()
-        print('Доска компьютера:\n')
-        self.ai.own_board.show()
-
-    def loop(self) -> None:
+        sys.stdout.write('\n\n\n' + '-' * 50 + '\n'
+                         + 'Доска пользователя:\n\n' + self.user.own_board.render()
+                         + 'Доска компьютера:\n\n' + self.ai.own_board.render())
+
+    def count_move(self, player: Player, hit: bool, live_ships: int) -> None:
+        self.metrics.incr('shots')
+        if hit:
+            self.metrics.incr('hits')
+            if player.opponent_board.live_ships < live_ships:
+                self.metrics.incr('kills')
+        if isinstance(player, AI):
+            self.metrics.observe('shot_pool_size', player.shot_candidates())
+
+    def loop(self) -> Player:
         player = 0
-        while True:
-            self.show_boards()
-            if player % 2 == 0:
-                print('Ваш ход:')
-                repeat = self.user.move()
-            else:
-                print('Ходит компьютер:')
-                repeat = self.ai.move()
-            player += 0 if repeat else 1
-            if self.ai.own_board.is_loser():
-                print('\n\n\n' + '-' * 50 + '\n\n\n')
-                print('#' * 22 + '\n#    Вы выиграли!    #\n' + '#' * 22)
-                self.show_boards()
-                break
-            if self.user.own_board.is_loser():
-                print('\n\n\n' + '-' * 50 + '\n\n\n')
-                print('#' * 22 + '\n# Компьютер выиграл! #\n' + '#' * 22)
-                self.show_boards()
-                break
+        with self.metrics.timer('play'):
+            while True:
+                current = self.user if player % 2 == 0 else self.ai
+                self.sink.turn(self, current)
+                live_ships = current.opponent_board.live_ships
+                repeat = current.move()
+                if self.metrics.enabled:
+                    self.count_move(current, repeat, live_ships)
+                player += 0 if repeat else 1
+                if self.ai.own_board.is_loser():
+                    self.sink.game_over(self, self.user)
+                    return self.user
+                if self.user.own_board.is_loser():
+                    self.sink.game_over(self, self.ai)
+                    return self.ai
 
     def start(self) -> None:
         Game.greet()
         self.loop()
 
+class SimulationGame(Game):
+    # Партия компьютер против компьютера: ход пользователя тоже делает AI,
+    # а по умолчанию события уходят в NullSink без print и sleep.
+
+    def __init__(self, board_cls: type = Board, sink: EventSink = None,
+                 ai_cls: type = AI, user_ai_cls: type = AI,
+                 metrics: Metrics = None) -> None:
+        super().__init__(board_cls, sink if sink is not None else NullSink(),
+                         ai_cls, metrics)
+        self.user = user_ai_cls(self.user_board, self.ai_board)
+
+
+def simulate(games: int, board_cls: type = Board, sink: EventSink = None,
+             ai_cls: type = AI, user_ai_cls: type = AI,
+             metrics: Metrics = None) -> tuple[int, float]:
+    # Играет games партий подряд, возвращает число побед первого AI
+    # и затраченное время в секундах; metrics накапливает счётчики всех партий
+    first_wins = 0
+    started = perf_counter()
+    for _ in range(games):
+        game = SimulationGame(board_cls, sink, ai_cls, user_ai_cls, metrics)
+        if game.loop() is game.user:
+            first_wins += 1
+    return first_wins, perf_counter() - started
+
+
+class SessionSink(EventSink):
+    # События сетевой сессии: строки протокола копятся в общем списке
+    # и отправляются клиенту одной пачкой после хода.
+    # На доске пользователя стреляет компьютер, поэтому её события
+    # помечаются префиксом 'AI '.
+
+    def __init__(self, lines: list[str], prefix: str = '') -> None:
+        self.lines = lines
+        self.prefix = prefix
+
+    def shot(self, dot: Dot, result: str) -> None:
+        self.lines.append(f'{self.prefix}{result.upper()} {dot.x + 1} {dot.y + 1}')
+
+
+class GameSession():
+    # Одна партия человека с компьютером без input(): ход пользователя
+    # приходит готовыми координатами, ответ - строки протокола.
+
+    def __init__(self, board_cls: type = BitBoard, ai_cls: type = AI,
+                 metrics: Metrics = None) -> None:
+        self.lines = []
+        self.game = Game(board_cls, SessionSink(self.lines), ai_cls, metrics)
+        self.game.user_board.sink = SessionSink(self.lines, 'AI ')
+        self.winner = None
+
+    def take_lines(self) -> list[str]:
+        lines = self.lines[:]
+        self.lines.clear()
+        return lines
+
+    def check_winner(self) -> bool:
+        if self.game.ai_board.is_loser():
+            self.winner = self.game.user
+        elif self.game.user_board.is_loser():
+            self.winner = self.game.ai
+        return self.winner is not None
+
+    def play(self, player: Player, dot: Dot = None) -> bool:
+        # Без dot ход делает сам игрок (компьютер)
+        live_ships = player.opponent_board.live_ships
+        repeat = player.move() if dot is None else player.opponent_board.shot(dot)
+        if self.game.metrics.enabled:
+            self.game.count_move(player, repeat, live_ships)
+        return repeat
+
+    def user_shot(self, x: int, y: int) -> bool:
+        # Возвращает True, если после выстрела ходит компьютер.
+        # Ошибки доски (BoardException) передаются вызывающему.
+        repeat = self.play(self.game.user, Dot(x - 1, y - 1))
+        return not self.check_winner() and not repeat
+
+    def ai_turn(self) -> None:
+        # Компьютер стреляет, пока попадает
+        while self.play(self.game.ai) and not self.check_winner():
+            pass
+
+    def result(self) -> str:
+        if self.winner is None:
+            return 'TURN'
+        return 'WIN USER' if self.winner is self.game.user else 'WIN AI'
+
+
+class GameServer():
+    # Много партий в одном процессе на asyncio. Протокол строковый:
+    #   сервер: READY <размер>, TURN - ждёт хода;
+    #   клиент: "x y" (с 1), SHOW - обе доски, QUIT - выход;
+    #   ответ на ход: MISS/HIT/KILL x y, затем выстрелы компьютера
+    #   AI MISS/HIT/KILL x y, затем TURN или WIN USER / WIN AI;
+    #   ERROR <текст> - ход не принят, TIMEOUT - сессия простаивала.
+    # Ход быстрого AI делается сразу, медленного (AI.slow) - в пуле
+    # потоков, чтобы не задерживать остальные сессии. Общие metrics
+    # меняются только в потоке цикла событий.
+    INPUT_ERROR = 'ERROR Внимательнее, вводите две цифры через пробел.'
+
+    def __init__(self, board_cls: type = BitBoard, ai_cls: type = AI,
+                 idle_timeout: float = 300.0, metrics: Metrics = None) -> None:
+        self.board_cls = board_cls
+        self.ai_cls = ai_cls
+        self.idle_timeout = idle_timeout
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self.active = 0
+        self.finished = 0
+        self.timeouts = 0
+
+    async def command(self, session: GameSession, line: str) -> list[str]:
+        if line == 'SHOW':
+            return (session.game.user_board.render() + session.game.ai_board.render()).splitlines() + ['END']
+        try:
+            x, y = map(int, line.split())
+            ai_turn = session.user_shot(x, y)
+        except ValueError:
+            return [self.INPUT_ERROR]
+        except BoardException as e:
+            return ['ERROR ' + str(e).strip()]
+        if ai_turn:
+            if self.ai_cls.slow:
+                # Ход в пуле считает в свои счётчики, они сливаются в общие здесь
+                turn_metrics = Metrics() if self.metrics.enabled else NULL_METRICS
+                session.game.metrics = turn_metrics
+                try:
+                    await asyncio.get_running_loop().run_in_executor(None, session.ai_turn)
+                finally:
+                    session.game.metrics = self.metrics
+                self.metrics.merge(turn_metrics)
+            else:
+                session.ai_turn()
+        return session.take_lines() + [session.result()]
+
+    @staticmethod
+    async def read_line(reader: asyncio.StreamReader) -> bytes:
+        # Как readline, но строка длиннее лимита StreamReader (64 КиБ)
+        # пропускается целиком до перевода строки и возвращается None
+        try:
+            return await reader.readuntil(b'\n')
+        except asyncio.IncompleteReadError as e:
+            return e.partial
+        except asyncio.LimitOverrunError as e:
+            consumed = e.consumed
+        while True:
+            # readuntil оставляет данные в буфере, выбрасываем их сами
+            try:
+                await reader.readexactly(consumed)
+                await reader.readuntil(b'\n')
+                return None
+            except asyncio.IncompleteReadError:
+                return b''
+            except asyncio.LimitOverrunError as e:
+                consumed = e.consumed
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.active += 1
+        session = GameSession(self.board_cls, self.ai_cls, self.metrics)
+        try:
+            writer.write(f'READY {BOARD_SIZE}\nTURN\n'.encode())
+            while session.winner is None:
+                try:
+                    line = await asyncio.wait_for(self.read_line(reader), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    writer.write(b'TIMEOUT\n')
+                    break
+                if line is None:
+                    writer.write((self.INPUT_ERROR + '\n').encode())
+                    await writer.drain()
+                    continue
+                # b'' - клиент закрыл соединение; пустая строка - ошибка ввода
+                if not line:
+                    break
+                line = line.decode(errors='replace').strip()
+                if line == 'QUIT':
+                    break
+                writer.write(('\n'.join(await self.command(session, line)) + '\n').encode())
+                await writer.drain()
+            if session.winner is not None:
+                self.finished += 1
+        except ConnectionError:
+            pass
+        finally:
+            self.active -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self.handle, host, port, backlog=4096)
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8765) -> None:
+        server = await self.start(host, port)
+        print(f'Сервер слушает {host}:{port}')
+        async with server:
+            await server.serve_forever()
+
+
+async def play_client(host: str, port: int) -> tuple[str, int]:
+    # Клиент-заглушка для нагрузочного теста: стреляет в случайные
+    # ещё не открытые клетки. Возвращает итог партии и число ходов.
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        size = int((await reader.readline()).split()[1])
+        untried = ShotPool((x, y) for x in range(1, size + 1)
+                           for y in range(1, size + 1))
+        moves = 0
+        line = (await reader.readline()).decode().strip()
+        while line == 'TURN':
+            x, y = untried.sample()
+            writer.write(f'{x} {y}\n'.encode())
+            moves += 1
+            while True:
+                line = (await reader.readline()).decode().strip()
+                if line == 'TURN' or line.startswith('WIN') or not line:
+                    break
+                words = line.split()
+                if words[0] in ('MISS', 'HIT', 'KILL'):
+                    # после потопления открывается ореол, его клетки
+                    # сервер отвергнет с ERROR, и клиент выберет другую
+                    untried.discard((int(words[1]), int(words[2])))
+                elif words[0] == 'ERROR':
+                    line = 'TURN'
+                    break
+        return line, moves
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def load_test(clients: int, concurrency: int, host: str = None,
+                    port: int = 0, server: GameServer = None) -> None:
+    # Играет clients партий, не больше concurrency одновременно.
+    # Без host поднимает сервер в этом же процессе на свободном порту.
+    if host is None:
+        server = server or GameServer()
+        listener = await server.start('127.0.0.1', 0)
+        host, port = listener.sockets[0].getsockname()[:2]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one_game() -> str:
+        async with semaphore:
+            started = perf_counter()
+            result, moves = await play_client(host, port)
+            latencies.append((perf_counter() - started) / max(moves, 1))
+            return result
+
+    started = perf_counter()
+    results = await asyncio.gather(*(one_game() for _ in range(clients)))
+    elapsed = perf_counter() - started
+    latencies.sort()
+    print(f'Партий: {clients}, одновременно: {concurrency}, '
+          f'время: {elapsed:.2f} с, партий в секунду: {clients / elapsed:.1f}')
+    print(f'Побед клиента: {results.count("WIN USER")}, компьютера: {results.count("WIN AI")}, '
+          f'не доиграно: {clients - results.count("WIN USER") - results.count("WIN AI")}')
+    print(f'Время ответа на ход: медиана {latencies[len(latencies) // 2] * 1000:.2f} мс, '
+          f'95% {latencies[int(len(latencies) * 0.95)] * 1000:.2f} мс')
+
+
+BOARD_CLASSES = {'list': Board, 'bit': BitBoard}
+AI_CLASSES = {'random': AI, 'density': DensityAI}
+
 
 if __name__ == '__main__':
-    game = Game()
-    game.start()
+    parser = argparse.ArgumentParser(description='Морской бой')
+    parser.add_argument('--simulate', type=int, metavar='N',
+                        help='сыграть N партий AI против AI без вывода')
+    parser.add_argument('--board', choices=BOARD_CLASSES, default='list',
+                        help='движок доски')
+    parser.add_argument('--ai', choices=AI_CLASSES, default='random',
+                        help='стратегия компьютера')
+    parser.add_argument('--first-ai', choices=AI_CLASSES, default='random',
+                        help='стратегия первого AI в симуляции')
+    parser.add_argument('--render', choices=['full', 'diff'], default='full',
+                        help='full - каждый кадр целиком, '
+                             'diff - только изменившиеся клетки (ANSI)')
+    parser.add_argument('--verbose', action='store_true',
+                        help='показывать ход симуляции в консоли')
+    parser.add_argument('--serve', metavar='[HOST:]PORT',
+                        help='запустить сервер для многих игроков по TCP')
+    parser.add_argument('--idle-timeout', type=float, default=300.0,
+                        help='через сколько секунд без хода закрывать сессию')
+    parser.add_argument('--load-test', type=int, metavar='N',
+                        help='сыграть N партий тестовыми клиентами '
+                             '(с --connect - против внешнего сервера)')
+    parser.add_argument('--concurrency', type=int, default=1000,
+                        help='одновременных клиентов в нагрузочном тесте')
+    parser.add_argument('--connect', metavar='HOST:PORT',
+                        help='адрес сервера для нагрузочного теста')
+    parser.add_argument('--pool', metavar='PATH',
+                        help='брать расстановки из готового пула '
+                             '(python fleet_placement.py PATH)')
+    parser.add_argument('--metrics', metavar='PATH',
+                        help='записать счётчики симуляции в формате Prometheus '
+                             '(- для вывода в консоль)')
+    args = parser.parse_args()
+    board_cls = BOARD_CLASSES[args.board]
+    ai_cls = AI_CLASSES[args.ai]
+    console_cls = AnsiSink if args.render == 'diff' else ConsoleSink
+    if args.pool:
+        pool = use_pool(args.pool)
+        if pool.size != BOARD_SIZE or pool.ship_types != sorted(SHIPS_TYPES, reverse=True):
+            parser.error(f'пул {args.pool} сделан для другой доски или флота')
+    if args.serve or args.load_test:
+        server = GameServer(board_cls, ai_cls, args.idle_timeout)
+        if args.serve:
+            host, _, port = args.serve.rpartition(':')
+            asyncio.run(server.serve(host or '127.0.0.1', int(port)))
+        elif args.connect:
+            host, _, port = args.connect.rpartition(':')
+            asyncio.run(load_test(args.load_test, args.concurrency, host, int(port)))
+        else:
+            asyncio.run(load_test(args.load_test, args.concurrency, server=server))
+    elif args.simulate:
+        sink = console_cls() if args.verbose else NullSink()
+        metrics = Metrics() if args.metrics else None
+        wins, elapsed = simulate(args.simulate, board_cls, sink, ai_cls,
+                                 AI_CLASSES[args.first_ai], metrics)
+        print(f'Партий: {args.simulate}, побед первого AI: {wins}, '
+              f'время: {elapsed:.2f} с, '
+              f'партий в секунду: {args.simulate / elapsed:.1f}')
+        if metrics is not None:
+            export(metrics, args.metrics)
+    else:
+        game = Game(board_cls, console_cls(), ai_cls)
+        game.start()
     
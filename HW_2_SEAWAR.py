@@ -1,78 +1,204 @@
 import service
+import argparse
+import os
+import random
+from array import array
+from combo_cache import CombinationView, get_combinations
+from event_log import EVENTS, GAME, MOVE, setup_event_log
+from fleet_placement import FleetPlacer, LayoutPool, write_pool
+from metrics import Metrics, NULL_METRICS, export
+from replay_log import GameRecorder, PlayerRecord, ReplayBuffer, ReplayWriter
+from shot_pool import ShotPool
+from stats_stream import StreamingStats, CsvGameWriter, ChunkedColumnWriter, wilson_interval
 from random import choice, randint, shuffle
-from copy import copy, deepcopy
+from collections import Counter, namedtuple
+from math import gcd
+from statistics import NormalDist
+from concurrent.futures import ProcessPoolExecutor
 from logging import basicConfig, INFO, info
 
 basicConfig(format=u'[%(asctime)s]  %(message)s', level=INFO)
 
+# Размер доски и корабли флота игрока (количество палуб)
+BOARD_SIZE = 10
+SHIPS_TYPES = [3, 2, 2, 1, 1, 1, 1]
+# Стратегии расстановки кораблей
+STRATEGY_LIST = ["for_1_ship_left",
+                 "for_1_ship_right",
+                 "for_1_ship_top",
+                 "for_1_ship_bottom",
+                 "for_1_ship_center_horisontal",
+                 "for_1_ship_center_vertical",
+                 "for_1_ship_36",
+                 "random_12"]
+# Стратегии ходов в постоянном порядке, номер в списке - id в статистике
+STEPS_STRATEGY_LIST = sorted(service.STEPS_STRATEGY.keys())
+# Очередь стратегий расстановки, из которой их получают новые игроки
+STRATEGY_QUOTA = []
+# Счётчики и таймеры текущего процесса, по умолчанию выключены (см. play_match)
+metrics = NULL_METRICS
+# Готовые расстановки по стратегиям (см. use_layout_pools)
+LAYOUT_POOLS = {}
+
+
+# Результат одного хода: кто стрелял, в кого, куда, итог выстрела и окончена ли игра
+MoveResult = namedtuple('MoveResult', ['player', 'target', 'crd', 'state', 'finished'])
+
 
 class Game(object):
-    def __init__(self, player1, player2):
+    """Игра двух игроков в виде конечного автомата: каждый вызов step()
+    делает один ход, поэтому стек не растёт с длиной партии"""
+
+    def __init__(self, player1, player2, recorder=None, label=None):
         # info(u'Начало игры')
         self.player_list = [player1, player2]
         self.curr_player = None
+        self.winner = None
+        # GameRecorder для записи ходов в лог повторов
+        self.recorder = recorder
+        # Метка игры в журнале событий (зерно матча)
+        self.label = label
+        self.metrics = metrics
         self.player_log_list()
 
     def player_log_list(self):
         # info(u'Игроки: %s', ", ".join([x.player_name for x in self.player_list]))
         pass
 
-    def game(self):
+    def step(self):
+        """Делает один ход и возвращает MoveResult, None - если игра уже окончена"""
+        if self.winner is not None:
+            return None
         tour_stats.game_id += 1
         # Выбираем игрока для первого хода
         if self.curr_player is None:
             self.curr_player = choice(self.player_list)
+        shooter = self.curr_player
         # Получаем координаты для хода
-        crd_for_shoot = self.curr_player.strategy.get_crd_for_step()
+        crd_for_shoot = shooter.strategy.get_crd_for_step()
         # Выделяем второго игрока из списка
-        player2 = filter(lambda x: x != self.curr_player, self.player_list)[0]
+        player2 = [x for x in self.player_list if x != shooter][0]
         # Ходим и сохраняем результаты хода
         shoot_res = player2.shoot(crd_for_shoot)
+        if self.recorder is not None:
+            self.recorder.add(self.player_list.index(shooter), crd_for_shoot)
         # Передаём результаты хода ходившему игроку
-        # logging.info(u'Ходит: %s, координаты: %s, статус: %s', self.curr_player.player_name, crd_for_shoot, shoot_res)
-        self.curr_player.strategy.return_shoot_state(shoot_res, crd_for_shoot, player2)
-        self.curr_player.stat.step += 1
+        # Поля события собираются, только если журнал ходов включён
+        if EVENTS.isEnabledFor(MOVE):
+            EVENTS.debug('move', extra={'event': {
+                'game': self.label, 'shooter': shooter.player_name, 'target': player2.player_name,
+                'crd': crd_for_shoot, 'state': shoot_res, 'step': shooter.stat.step + 1}})
+        shooter.strategy.return_shoot_state(shoot_res, crd_for_shoot, player2)
+        if self.metrics.enabled:
+            self.count_move(shooter, shoot_res)
+        shooter.stat.step += 1
         if shoot_res in [u'Убил!', u'Попал!']:
-            self.curr_player.stat.score += 1
+            shooter.stat.score += 1
         # Меняем счётчик текущего пользователя, если ходивший промазал
         if shoot_res == u'Мимо!':
             self.curr_player = player2
         # Конец игры и вывод статистики
         if shoot_res == u'Убил!':
-            self.curr_player.stat.ships_defeat.append(1)
-            if len(self.curr_player.stat.ships_defeat) == 10:
+            shooter.stat.ships_defeat.append(1)
+            if len(shooter.stat.ships_defeat) == len(SHIPS_TYPES):
                 # info(u'Выйграл: %s', self.curr_player.player_name)
                 # info(u'%s', ", ".join([str(x.player_name) + u" набрал очков:  " + str(x.scores) + u", ходов: " + str(x.steps) for x in self.player_list]))
                 # Сбрасываем счётчики
-                self.curr_player.stat.tur_scores += self.curr_player.stat.score
-                tour_stats.get_stats(self.player_list)
-                self.curr_player.reset_values()
+                shooter.stat.tur_scores += shooter.stat.score
+                if EVENTS.isEnabledFor(GAME):
+                    EVENTS.info('game', extra={'event': {
+                        'game': self.label, 'winner': shooter.player_name, 'loser': player2.player_name,
+                        'steps': [player.stat.step for player in self.player_list],
+                        'scores': [player.stat.score for player in self.player_list]}})
+                with self.metrics.timer('stats'):
+                    tour_stats.get_stats(self.player_list)
+                # Новую расстановку получает только тот, кто играет дальше (см. play_match)
+                self.winner = shooter
                 # info(u'------------------')
-                return self.curr_player
-        # Если игра продолжается, то перезапускаем функцию game()
-        return self.game()
+        return MoveResult(shooter, player2, crd_for_shoot, shoot_res, self.winner is not None)
+
+    def count_move(self, shooter, shoot_res):
+        self.metrics.incr('shots')
+        if shoot_res != u'Мимо!':
+            self.metrics.incr('hits')
+        if shoot_res == u'Убил!':
+            self.metrics.incr('kills')
+        self.metrics.observe('shot_pool_size', len(shooter.strategy.untried))
+        self.metrics.observe('steps_pool_size', len(shooter.strategy.steps_cords))
+
+    def run_to_end(self):
+        """Играет до конца и возвращает победителя. Время фазы play включает
+        подсчёт статистики в конце игры"""
+        with self.metrics.timer('play'):
+            while self.winner is None:
+                self.step()
+        return self.winner
+
+    def reset(self):
+        """Начинает новую игру с теми же игроками"""
+        for player in self.player_list:
+            player.reset_values()
+        self.curr_player = None
+        self.winner = None
+
+    def game(self):
+        return self.run_to_end()
 
 
 class Player(object):
-    def __init__(self):
+    def __init__(self, ships_strategy=None, steps_strategy=None):
         self.player_name = service.rdn_usr_name()
-        self.strategy = PlayerStrategy()
+        self.strategy = PlayerStrategy(ships_strategy, steps_strategy)
         self.stat = PlayerStatistic()
         self.ships = self.create_ships()
 
+    @classmethod
+    def restore(cls, descriptor):
+        """Игрок из player_descriptor: те же имя, стратегии, расстановка и очки
+        турнира, без новой расстановки и без обращения к random"""
+        record, tur_scores = descriptor
+        player = cls.__new__(cls)
+        player.player_name = record.name
+        player.strategy = PlayerStrategy(STRATEGY_LIST[record.ships_strategy_id],
+                                         STEPS_STRATEGY_LIST[record.steps_strategy_id])
+        # Стратегия ходов задана только на эту игру, дальше снова случайная
+        player.strategy.fixed_steps_strategy = None
+        player.stat = PlayerStatistic()
+        player.stat.tur_scores = tur_scores
+        player.ships = [Ship(len(cords), cords, service.set_halo(cords)) for cords in record.ships]
+        return player
+
     def create_ships(self):
+        pool = LAYOUT_POOLS.get(self.strategy.ships_strategy_collocation)
+        if pool is not None:
+            # Расстановка берётся из пула целиком, без подбора комбинаций
+            if metrics.enabled:
+                metrics.incr('pool_draws')
+            self.ships = []
+            for ship_cells in pool.ships(random.randrange(len(pool))):
+                cords = [list(crd) for crd in ship_cells]
+                self.ships.append(Ship(len(cords), cords, service.set_halo(cords)))
+            return self.ships
         self.ships = []
         buff_cord = []
-        ships = [3, 2, 2, 1, 1, 1, 1]
-        for ship in ships:
-            if self.strategy.combinations[ship]:
-                cords = choice(self.strategy.combinations[ship])
+        measure = metrics.enabled
+        while len(buff_cord) != len(SHIPS_TYPES):
+            ship = SHIPS_TYPES[len(buff_cord)]
+            if measure:
+                metrics.observe('placement_candidates', bin(self.strategy.combinations.available[ship]).count('1'))
+            if self.strategy.combinations.available[ship]:
+                if measure:
+                    metrics.incr('placement_attempts')
+                cords = self.strategy.combinations.choice(ship)
                 overlay = service.set_halo(cords)
                 self.strategy.data_cleaner(cords, overlay)
                 buff_cord.append([ship, cords, overlay])
             else:
+                # Комбинации кончились - начинаем расстановку заново
+                if measure:
+                    metrics.incr('placement_restarts')
                 self.strategy.reload()
-                return self.create_ships()
+                buff_cord = []
         for cords_for_unpack in buff_cord:
             ship, cords, overlay = cords_for_unpack
             self.ships.append(Ship(ship, cords, overlay))
@@ -124,67 +250,121 @@ class PlayerStatistic(object):
 
 
 class TournaimentStatistic(object):
-    def __init__(self):
+    """Статистика турнира: по одной записи фиксированной ширины на игрока за игру,
+    хранится по колонкам в array (numpy.frombuffer читает их без копирования).
+    Параллельно обновляются потоковые накопители stream и счётчики пар стратегий
+    pairs, а подключённые writers получают записи по мере окончания игр.
+    С keep_records=False колонки не копятся и память не растёт с числом игр:
+    отчёт строится по stream и pairs, записи уходят только во writers"""
+    # Колонка и код типа array
+    COLUMNS = (('game', 'I'), ('steps', 'H'), ('score', 'H'), ('kills', 'B'), ('won', 'B'),
+               ('ships_strategy_id', 'B'), ('steps_strategy_id', 'B'))
+
+    def __init__(self, keep_records=True):
         self.game_id = 0
-        self.step_all = []
-        self.step_winners = []
-        self.scores_loosers = []
-        self.step_loosers = []
-        self.players_copy_list = []
+        self.games = 0
+        self.keep_records = keep_records
+        for column, typecode in self.COLUMNS:
+            setattr(self, column, array(typecode))
+        self.stream = StreamingStats()
+        # (стратегия расстановки, стратегия ходов, победил) -> число записей
+        self.pairs = Counter()
+        self.writers = []
+
+    def append_record(self, record):
+        if self.keep_records:
+            for (column, typecode), value in zip(self.COLUMNS, record):
+                getattr(self, column).append(value)
+        for writer in self.writers:
+            writer.write(record)
 
     def get_stats(self, player_list):
-        self.players_copy_list.extend([deepcopy(player) for player in player_list])
+        for player in player_list:
+            kills = len(player.stat.ships_defeat)
+            won = int(kills == len(SHIPS_TYPES))
+            ships_strategy_id = STRATEGY_LIST.index(player.strategy.ships_strategy_collocation)
+            steps_strategy_id = STEPS_STRATEGY_LIST.index(player.strategy.steps_strategy)
+            self.append_record((self.games, player.stat.step, player.stat.score, kills, won,
+                                ships_strategy_id, steps_strategy_id))
+            self.stream.add(player.stat.step, player.stat.score, won, ships_strategy_id, steps_strategy_id)
+            self.pairs[(ships_strategy_id, steps_strategy_id, won)] += 1
+        self.games += 1
+
+    def merge(self, other):
+        """Добавляет статистику матчей, сыгранных отдельно (например, в другом процессе)"""
+        self.game_id += other.game_id
+        for record in zip(*[getattr(other, column) for column, typecode in self.COLUMNS]):
+            self.append_record((record[0] + self.games,) + record[1:])
+        self.games += other.games
+        self.stream.merge(other.stream)
+        self.pairs.update(other.pairs)
+
+    def close_writers(self):
+        for writer in self.writers:
+            writer.close()
+        self.writers = []
+
+    def select(self, column, won=None):
+        """Значения колонки для всех записей, только победителей (won=True) или проигравших (won=False)"""
+        values = getattr(self, column)
+        if won is None:
+            return list(values)
+        return [value for value, flag in zip(values, self.won) if flag == won]
+
+    def mean(self, column, won=None):
+        values = self.select(column, won)
+        return sum(values) / float(len(values))
 
     def count_middles(self):
-        self.step_all = [player.stat.step for player in self.players_copy_list]
-        self.step_winners = [player.stat.step for player in self.players_copy_list if
-                             len(player.stat.ships_defeat) == 10]
-        self.step_loosers = [player.stat.step for player in self.players_copy_list if
-                             len(player.stat.ships_defeat) != 10]
-        self.scores_loosers = [player.stat.score for player in self.players_copy_list if
-                               len(player.stat.ships_defeat) != 10]
-        return sum(self.step_all) / float(len(self.step_all)), sum(self.step_winners) / float(
-            len(self.step_winners)), sum(self.step_loosers) / float(len(self.step_loosers)), sum(
-            self.scores_loosers) / float(len(self.scores_loosers))
+        """Средние ходы всех, победителей и проигравших и средние очки проигравших
+        из потоковых накопителей, без копирования колонок"""
+        groups = self.stream.groups
+        return (groups[('all',)].steps.mean, groups[('won', True)].steps.mean,
+                groups[('won', False)].steps.mean, groups[('won', False)].score.mean)
 
     def startegy_effect(self):
-        report_strategy = {u"Победители": [], u"Проигравшие": []}
-        for player in self.players_copy_list:
-            pl_stat = ""
-            if len(player.stat.ships_defeat) == 10:
-                pl_stat = u"Победители"
-            else:
-                pl_stat = u"Проигравшие"
-            report_strategy[pl_stat].append(
-                [player.strategy.ships_strategy_collocation, player.strategy.steps_strategy])
-        return report_strategy
+        """Сколько раз каждая пара (стратегия расстановки, стратегия ходов) была у победителей
+        и у проигравших, по убыванию"""
+        effect = {u"Победители": [], u"Проигравшие": []}
+        for (ships_id, steps_id, won), count in self.pairs.most_common():
+            title = u"Победители" if won else u"Проигравшие"
+            effect[title].append(((STRATEGY_LIST[ships_id], STEPS_STRATEGY_LIST[steps_id]), count))
+        return effect
 
 
 class PlayerStrategy(object):
-    def __init__(self):
-        self.alien_cords = []
-        self.recomendation_pool = []
+    def __init__(self, ships_strategy=None, steps_strategy=None):
+        """Без ships_strategy стратегия расстановки берётся из STRATEGY_QUOTA,
+        без steps_strategy стратегия ходов выбирается случайно перед каждой игрой"""
         self.succ_shoots = []
-        self.ships_strategy_collocation = STRATEGY_QUOTA.pop()
-        self.combinations = deepcopy(service.gen_cord(self.ships_strategy_collocation))
-        self.steps_strategy = choice(list(service.STEPS_STRATEGY.keys()))
-        self.steps_cords = deepcopy(service.STEPS_STRATEGY[self.steps_strategy])
+        self.ships_strategy_collocation = ships_strategy or STRATEGY_QUOTA.pop()
+        self.fixed_steps_strategy = steps_strategy
+        # Общий для стратегии набор комбинаций и маски доступных игроку
+        self.combinations = CombinationView(self.ships_strategy_collocation)
+        self.reset_shots()
+
+    def reset_shots(self):
+        """Пулы клеток для выстрелов: все ещё не обстрелянные и клетки стратегии ходов"""
+        self.untried = ShotPool(tuple(crd) for crd in service.CORD_10_10)
+        self.steps_strategy = self.fixed_steps_strategy or choice(list(service.STEPS_STRATEGY.keys()))
+        self.steps_cords = ShotPool(tuple(crd) for crd in service.STEPS_STRATEGY[self.steps_strategy])
+
+    @property
+    def recomendation_pool(self):
+        """Клетки для добивания раненого корабля"""
+        return self.untried.priority
 
     def get_crd_for_step(self):
         """Выбор координат для хода"""
-        if self.recomendation_pool:
-            crd = self.recomendation_pool.pop(0)
-        elif self.steps_cords:
-            shuffle(self.steps_cords)
-            crd = self.steps_cords.pop(0)
-        else:
-            crd = choice(filter(lambda x: x not in self.alien_cords, service.CORD_10_10))
-        if crd in self.recomendation_pool:
-            self.recomendation_pool.remove(crd)
-        elif crd in self.recomendation_pool:
-            self.recomendation_pool.remove(crd)
-        self.alien_cords.append(crd)
-        return crd
+        crd = self.untried.pop_priority()
+        if crd is None:
+            if self.steps_cords:
+                crd = self.steps_cords.sample()
+            else:
+                crd = self.untried.sample()
+        self.untried.discard(crd)
+        self.steps_cords.discard(crd)
+        return list(crd)
 
     def return_shoot_state(self, state, crd, player2):
         """Стратегия дальнейщих ходов в зависимости от результата текущего хода"""
@@ -193,7 +373,8 @@ class PlayerStrategy(object):
                 crd_rec = [[crd[0] - 1, crd[1]], [crd[0] + 1, crd[1]], [crd[0], crd[1] - 1], [crd[0], crd[1] + 1]]
                 crd_rec = filter(lambda x: 0 <= x[0] <= 9 and 0 <= x[1] <= 9, crd_rec)
                 self.succ_shoots.append(crd)
-                self.recomendation_pool.extend([crd for crd in crd_rec if crd not in self.alien_cords])
+                for crd in crd_rec:
+                    self.untried.push_priority(tuple(crd))
             else:
                 crd_s1 = self.recomendation_pool[0]
                 crd_s2 = self.succ_shoots[0]
@@ -204,76 +385,475 @@ class PlayerStrategy(object):
                         else:
                             crd_rec = [[crd_s1[ind] - 1, crd_s1[ind] - 2], [crd_s2[ind] + 1, crd_s2[ind] + 2]]
                         crd_rec = filter(lambda x: 0 <= x[0] <= 9 and 0 <= x[1] <= 9, crd_rec)
-                        self.recomendation_pool.extend([crd for crd in crd_rec if crd not in self.alien_cords])
+                        for crd in crd_rec:
+                            self.untried.push_priority(tuple(crd))
         elif state == u'Убил!':
             for ship in player2.ships:
                 if crd in ship.cord:
-                    self.alien_cords.extend([crd for crd in ship.halo if crd not in self.alien_cords])
-                    self.steps_cords = filter(lambda x: x not in ship.halo and x not in self.alien_cords,
-                                              self.steps_cords)
-            self.recomendation_pool = []
+                    for halo_crd in ship.halo:
+                        self.untried.discard(tuple(halo_crd))
+                        self.steps_cords.discard(tuple(halo_crd))
+            self.recomendation_pool.clear()
             self.succ_shoots = []
 
     def data_cleaner(self, cords, overlay):
         """Удаляет использованные комбинации из словаря комбинаций пользователя
         используется при создании кораблей"""
-        del_index = {}
-        for ship in self.combinations.keys():
-            del_index[ship] = []
-            for ind, crd_pack in enumerate(self.combinations[ship]):
-                for crd in cords + overlay:
-                    if crd in crd_pack and ind not in del_index[ship]:
-                        del_index[ship].append(ind)
-        for ship in del_index.keys():
-            for ind_for_del in reversed(del_index[ship]):
-                del self.combinations[ship][ind_for_del]
+        self.combinations.discard_cells(cords + overlay)
 
     def reload(self):
-        self.combinations = deepcopy(service.gen_cord(self.ships_strategy_collocation))
+        self.combinations.reset()
 
     def reset(self):
-        self.alien_cords = []
-        self.recomendation_pool = []
         self.succ_shoots = []
-        self.combinations = deepcopy(service.gen_cord(self.ships_strategy_collocation))
-        self.steps_strategy = choice(service.STEPS_STRATEGY.keys())
-        self.steps_cords = deepcopy(service.STEPS_STRATEGY[self.steps_strategy])
+        self.combinations.reset()
+        self.reset_shots()
 
 
-if __name__ == '__main__':
-    turnaiment_player_counter = 1024
+tour_stats = TournaimentStatistic()
+
+
+def fill_strategy_quota(player_counter):
+    """Поровну раздаёт стратегии расстановки на player_counter игроков"""
+    STRATEGY_QUOTA[:] = [y for y in STRATEGY_LIST for x in range(int(player_counter / len(STRATEGY_LIST)))]
+    shuffle(STRATEGY_QUOTA)
+
+
+def layout_pool_path(directory, ships_strategy_collocation):
+    return os.path.join(directory, ships_strategy_collocation + '.pool')
+
+
+def build_layout_pools(directory, count):
+    """Для каждой стратегии расстановки записывает пул из count разных
+    равновероятных расстановок, собранных из её комбинаций"""
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    for ships_strategy_collocation in STRATEGY_LIST:
+        combinations = get_combinations(ships_strategy_collocation).combinations
+        placer = FleetPlacer(BOARD_SIZE, SHIPS_TYPES, dict((ship, combinations[ship]) for ship in set(SHIPS_TYPES)))
+        layouts = placer.sample_layouts(count)
+        write_pool(layout_pool_path(directory, ships_strategy_collocation), BOARD_SIZE, SHIPS_TYPES, layouts)
+        info(u'Пул %s: расстановок %s', ships_strategy_collocation, len(layouts))
+
+
+def use_layout_pools(directory):
+    """Подключает пулы расстановок из directory: create_ships будет брать
+    расстановку из пула своей стратегии, если он есть"""
+    for ships_strategy_collocation in STRATEGY_LIST:
+        path = layout_pool_path(directory, ships_strategy_collocation)
+        if not os.path.exists(path):
+            continue
+        pool = LayoutPool(path)
+        if pool.size != BOARD_SIZE or pool.ship_types != sorted(SHIPS_TYPES, reverse=True):
+            raise ValueError(u'Пул %s сделан для другой доски или флота' % path)
+        LAYOUT_POOLS[ships_strategy_collocation] = pool
+
+
+def init_worker(layout_pools=None, event_log=None):
+    """Подготовка процесса пула: пулы расстановок и свой файл журнала
+    событий (path.pid), чтобы процессы не писали в один файл"""
+    if layout_pools:
+        use_layout_pools(layout_pools)
+    if event_log:
+        path, level = event_log
+        setup_event_log(u'%s.%s' % (path, os.getpid()), level)
+
+
+def player_record(player):
+    """Описание игрока и его текущей расстановки для лога повторов"""
+    return PlayerRecord(player.player_name, STRATEGY_LIST.index(player.strategy.ships_strategy_collocation),
+                        STEPS_STRATEGY_LIST.index(player.strategy.steps_strategy),
+                        [ship.cord for ship in player.ships])
+
+
+def player_descriptor(player):
+    """Компактное описание игрока между матчами, см. Player.restore"""
+    return player_record(player), player.stat.tur_scores
+
+
+def play_match(task):
+    """Играет один матч турнира с собственным зерном случайности.
+    Возвращает победителя, статистику этого матча, запись ходов и счётчики (если нужны)"""
+    global tour_stats, metrics
+    seed, player1, player2, record, measure = task
+    random.seed(seed)
+    tour_stats = TournaimentStatistic()
+    metrics = Metrics() if measure else NULL_METRICS
+    recorder = GameRecorder([player_record(player1), player_record(player2)]) if record else None
+    winner = Game(player1, player2, recorder, seed).game()
+    # Победитель играет следующий раунд, проигравший выбывает и не пересоздаётся
+    with metrics.timer('setup'):
+        winner.reset_values()
+    return winner, tour_stats, recorder, metrics
+
+
+def play_pairing(task):
+    """Играет games партий стратегии first против second со своим зерном.
+    Стратегия - пара (расстановка, ходы). Возвращает число побед first"""
+    global tour_stats
+    seed, first, second, games = task
+    random.seed(seed)
     tour_stats = TournaimentStatistic()
+    wins = 0
+    for _ in range(games):
+        player1 = Player(*first)
+        player2 = Player(*second)
+        if Game(player1, player2).game() is player1:
+            wins += 1
+    return wins
+
+
+class StrategyEvaluator(object):
+    """Круговой турнир стратегий: каждая пара (расстановка, ходы) играет с каждой
+    другой. Партии пары идут пачками по batch, после min_games пара проверяется
+    после каждой пачки и останавливается, как только доверительный интервал
+    Уилсона её доли побед стал уже 2 * precision или не содержит 0.5.
+    Не больше max_games на пару.
+
+    Проверок у пары может быть до looks, поэтому уровень z (по умолчанию 95%)
+    делится между ними поровну (поправка Бонферрони): вероятность хоть раз
+    ошибочно остановить равную пару и вероятность, что интервал в отчёте
+    не накрывает истинную долю, остаются не больше номинальных"""
+
+    def __init__(self, workers=None, seed=0, batch=20, precision=0.05, min_games=100, max_games=2000, z=1.96):
+        self.workers = workers or os.cpu_count() or 1
+        self.seed = seed
+        self.batch = batch
+        self.precision = precision
+        self.min_games = min_games
+        self.max_games = max_games
+        self.looks = max(1, max_games // batch - -(-min_games // batch) + 1)
+        normal = NormalDist()
+        self.z = normal.inv_cdf(1 - (1 - normal.cdf(z)) / self.looks)
+        self.strategies = [(ships_strategy, steps_strategy) for ships_strategy in STRATEGY_LIST
+                           for steps_strategy in STEPS_STRATEGY_LIST]
+        # (индекс первой, индекс второй) -> [победы первой, партии]
+        self.results = dict(((first, second), [0, 0]) for first in range(len(self.strategies))
+                            for second in range(first + 1, len(self.strategies)))
+
+    def finished(self, wins, games):
+        if games >= self.max_games:
+            return True
+        if games < self.min_games:
+            return False
+        low, high = wilson_interval(wins, games, self.z)
+        if high - low <= 2 * self.precision:
+            return True
+        return low > 0.5 or high < 0.5
+
+    def run(self):
+        """Играет, пока все пары не остановятся. Возвращает число сыгранных партий"""
+        pool = ProcessPoolExecutor(self.workers) if self.workers > 1 else None
+        batch_num = 0
+        try:
+            active = sorted(self.results)
+            while active:
+                tasks = [(u'%s:%s:%s:%s' % (self.seed, first, second, batch_num),
+                          self.strategies[first], self.strategies[second], self.batch)
+                         for first, second in active]
+                if pool is None:
+                    wins = map(play_pairing, tasks)
+                else:
+                    wins = pool.map(play_pairing, tasks, chunksize=max(1, len(tasks) // (self.workers * 4)))
+                for pairing, pairing_wins in zip(active, wins):
+                    self.results[pairing][0] += pairing_wins
+                    self.results[pairing][1] += self.batch
+                active = [pairing for pairing in active if not self.finished(*self.results[pairing])]
+                batch_num += 1
+                info(u'Пачка %s: пар в игре %s из %s', batch_num, len(active), len(self.results))
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        return sum(games for wins, games in self.results.values())
+
+    def totals(self, key):
+        """Победы и партии по группам: key(стратегия) -> [победы, партии]"""
+        totals = {}
+        for (first, second), (wins, games) in self.results.items():
+            for strategy, strategy_wins in ((self.strategies[first], wins), (self.strategies[second], games - wins)):
+                total = totals.setdefault(key(strategy), [0, 0])
+                total[0] += strategy_wins
+                total[1] += games
+        return totals
+
+    def ranking(self, key=tuple):
+        """[(группа, доля побед, нижняя граница, верхняя граница, партии)] по убыванию доли побед.
+        key группирует стратегии: по умолчанию пара целиком, lambda s: s[0] - только расстановка"""
+        ranking = []
+        for group, (wins, games) in self.totals(key).items():
+            low, high = wilson_interval(wins, games, self.z)
+            ranking.append((group, wins / float(games), low, high, games))
+        ranking.sort(key=lambda row: row[1], reverse=True)
+        return ranking
+
+    def report(self):
+        for title, key in ((u'Пары стратегий', tuple), (u'Расстановка', lambda strategy: strategy[0]),
+                           (u'Ходы', lambda strategy: strategy[1])):
+            info(u'%s:', title)
+            for group, rate, low, high, games in self.ranking(key):
+                if isinstance(group, tuple):
+                    group = u', '.join(group)
+                info(u'%s: %.3f [%.3f; %.3f], партий %s', group, rate, low, high, games)
+
+
+class TournamentRunner(object):
+    """Турнир на выбывание, матчи каждого раунда играются в пуле процессов.
+    У каждого матча своё зерно (seed, раунд, номер матча), поэтому
+    результат не зависит от числа процессов"""
+
+    def __init__(self, workers=None, seed=0, replay_path=None, metrics=None, layout_pools=None, event_log=None):
+        self.workers = workers or os.cpu_count() or 1
+        # Каталог пулов расстановок, который подключается и в процессах пула
+        self.layout_pools = layout_pools
+        # (файл, уровень) журнала событий для процессов пула
+        self.event_log = event_log
+        self.seed = seed
+        self.stats = TournaimentStatistic()
+        self.replay = ReplayWriter(replay_path) if replay_path else None
+        # Metrics, в которые сливаются счётчики всех матчей
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+
+    def match_seed(self, round_num, match_num):
+        return u'%s:%s:%s' % (self.seed, round_num, match_num)
+
+    def match_task(self, round_num, match_num, player1, player2):
+        return self.match_seed(round_num, match_num), player1, player2, self.replay is not None, self.metrics.enabled
+
+    def collect(self, round_num, match_num, result):
+        """Сливает статистику, счётчики и запись матча, возвращает победителя"""
+        winner, match_stats, recorder, match_metrics = result
+        self.stats.merge(match_stats)
+        self.metrics.merge(match_metrics)
+        if recorder is not None:
+            self.replay.append(recorder, round_num, match_num)
+        return winner
+
+    def play_single(self, round_num, match_num, player1, player2):
+        """Один матч сетки в текущем процессе"""
+        return self.collect(round_num, match_num, play_match(self.match_task(round_num, match_num, player1, player2)))
+
+    def make_pool(self):
+        return ProcessPoolExecutor(self.workers, initializer=init_worker,
+                                   initargs=(self.layout_pools, self.event_log))
+
+    def play_round(self, player_list, round_num, pool=None):
+        """Возвращает победителей раунда в порядке сетки"""
+        tasks = [self.match_task(round_num, player_ind // 2, player_list[player_ind - 1], player_list[player_ind])
+                 for player_ind in range(1, len(player_list), 2)]
+        if pool is None:
+            results = map(play_match, tasks)
+        else:
+            results = pool.map(play_match, tasks, chunksize=max(1, len(tasks) // (self.workers * 4)))
+        winners = [self.collect(round_num, match_num, result) for match_num, result in enumerate(results)]
+        steps = self.stats.stream.group(('all',)).steps
+        info(u'Раунд %s: сыграно игр %s, ходов в среднем %.2f (ст. откл. %.2f)', round_num + 1,
+             self.stats.games, steps.mean, steps.std)
+        return winners
+
+    def run(self, player_list, round_num=0, pool=None):
+        """Играет турнир до одного победителя и возвращает его.
+        round_num - номер первого раунда, если начало сетки уже сыграно"""
+        if pool is None and self.workers > 1:
+            with self.make_pool() as pool:
+                return self.run(player_list, round_num, pool)
+        while len(player_list) != 1:
+            player_list = self.play_round(player_list, round_num, pool)
+            round_num += 1
+        self.close()
+        return player_list[0]
+
+    def close(self):
+        if self.replay is not None:
+            self.replay.close()
+
+
+class StrategyQuota(object):
+    """Стратегии расстановки для player_counter игроков поровну, как в fill_strategy_quota,
+    но без списка: номер игрока переставляется аффинной перестановкой (a * i + b) mod N,
+    и позиция в перестановке определяет долю, а значит и стратегию"""
+
+    def __init__(self, player_counter, seed=0):
+        rnd = random.Random(u'%s:quota' % seed)
+        self.player_counter = player_counter
+        self.a = 1
+        if player_counter > 2:
+            self.a = rnd.randrange(1, player_counter)
+            while gcd(self.a, player_counter) != 1:
+                self.a = rnd.randrange(1, player_counter)
+        self.b = rnd.randrange(player_counter)
+
+    def __getitem__(self, player_num):
+        position = (self.a * player_num + self.b) % self.player_counter
+        return STRATEGY_LIST[position * len(STRATEGY_LIST) // self.player_counter]
+
+
+def lazy_players(seed, player_counter, start=0, stop=None, setup_metrics=NULL_METRICS):
+    """Игроки сетки по одному, по мере надобности. У каждого своё зерно
+    (seed, номер игрока), поэтому игрок не зависит от того, где его создали.
+    Расстановка кораблей новых игроков считается в setup_metrics"""
+    global metrics
+    quota = StrategyQuota(player_counter, seed)
+    for player_num in range(start, player_counter if stop is None else stop):
+        random.seed(u'%s:player:%s' % (seed, player_num))
+        # play_match подменяет metrics на счётчики матча
+        metrics = setup_metrics
+        with metrics.timer('setup'):
+            player = Player(quota[player_num])
+        yield player
+
+
+def stream_bracket(runner, players, offset=0):
+    """Сетка на выбывание за один проход по players: на каждом уровне сетки
+    ждёт не больше одного победителя, поэтому в памяти O(log N) компактных
+    описаний игроков (player_descriptor), а не самих игроков.
+    offset - номер первого игрока в общей сетке, если это её часть.
+    Номера раундов и матчей те же, что у TournamentRunner.run"""
+    pending = []
+    for position, player in enumerate(players, offset):
+        level = 0
+        while level < len(pending) and pending[level] is not None:
+            player = runner.play_single(level, position // 2, Player.restore(pending[level]), player)
+            pending[level] = None
+            position //= 2
+            level += 1
+        if level == len(pending):
+            pending.append(player_descriptor(player))
+        else:
+            pending[level] = player_descriptor(player)
+    if not pending or any(pending[:-1]):
+        raise ValueError(u'Число игроков должно быть степенью двойки')
+    return Player.restore(pending[-1])
+
+
+def play_subtree(task):
+    """Часть сетки из size игроков начиная с start в процессе пула.
+    Возвращает победителя, статистику, счётчики и записи ходов части.
+    Записи статистики копятся, только если их ждут writers основного процесса"""
+    seed, player_counter, start, size, record, measure, keep_records = task
+    runner = TournamentRunner(1, seed, metrics=Metrics() if measure else None)
+    runner.stats.keep_records = keep_records
+    if record:
+        runner.replay = ReplayBuffer()
+    players = lazy_players(seed, player_counter, start, start + size, runner.metrics)
+    champion = stream_bracket(runner, players, start)
+    return champion, runner.stats, runner.metrics, runner.replay
+
+
+class LazyBracket(object):
+    """Турнир на player_counter игроков без списка всех игроков: игроки создаются
+    по мере надобности (lazy_players), сетка играется потоково (stream_bracket).
+    С пулом процессов сетка делится на части, каждую часть играет свой процесс,
+    а победители частей доигрывают турнир обычными раундами.
+    Статистика копится только потоково (keep_records=False у runner.stats)"""
+
+    def __init__(self, runner, player_counter):
+        if player_counter < 2 or player_counter & (player_counter - 1):
+            raise ValueError(u'Число игроков должно быть степенью двойки')
+        self.runner = runner
+        self.runner.stats.keep_records = False
+        self.player_counter = player_counter
+
+    def run(self):
+        runner = self.runner
+        if runner.workers == 1:
+            champion = stream_bracket(runner, lazy_players(runner.seed, self.player_counter,
+                                                           setup_metrics=runner.metrics))
+            runner.close()
+            return champion
+        parts = 2
+        while parts < runner.workers * 4 and parts < self.player_counter // 2:
+            parts *= 2
+        size = self.player_counter // parts
+        tasks = [(runner.seed, self.player_counter, start, size, runner.replay is not None, runner.metrics.enabled,
+                  bool(runner.stats.writers))
+                 for start in range(0, self.player_counter, size)]
+        with runner.make_pool() as pool:
+            winners = []
+            for champion, stats, part_metrics, replay in pool.map(play_subtree, tasks):
+                winners.append(champion)
+                runner.stats.merge(stats)
+                runner.metrics.merge(part_metrics)
+                if replay is not None:
+                    replay.write_to(runner.replay)
+            info(u'Сыграно частей сетки: %s, игр %s', parts, runner.stats.games)
+            return runner.run(winners, size.bit_length() - 1, pool)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=u'Турнир по морскому бою')
+    parser.add_argument('--players', type=int, default=1024, help=u'количество игроков')
+    parser.add_argument('--workers', type=int, default=None, help=u'количество процессов (1 - без пула)')
+    parser.add_argument('--seed', type=int, default=0, help=u'зерно турнира')
+    parser.add_argument('--csv', help=u'файл для построчной выгрузки статистики в CSV')
+    parser.add_argument('--columnar', help=u'файл для колоночной бинарной выгрузки статистики')
+    parser.add_argument('--replay', help=u'файл для записи ходов всех игр (индекс - в файле с суффиксом .idx)')
+    parser.add_argument('--layout-pools', help=u'каталог пулов расстановок по стратегиям')
+    parser.add_argument('--build-layout-pools', metavar='DIR',
+                        help=u'сгенерировать пулы расстановок в каталог DIR и выйти')
+    parser.add_argument('--pool-size', type=int, default=20000, help=u'расстановок в пуле каждой стратегии')
+    parser.add_argument('--lazy', action='store_true',
+                        help=u'создавать игроков по мере надобности и играть сетку потоково '
+                             u'(число игроков - степень двойки)')
+    parser.add_argument('--evaluate', action='store_true',
+                        help=u'вместо турнира сравнить стратегии в круговом турнире с ранней остановкой')
+    parser.add_argument('--precision', type=float, default=0.05,
+                        help=u'полуширина доверительного интервала, при которой пара останавливается')
+    parser.add_argument('--max-games', type=int, default=2000, help=u'больше партий на пару не играть')
+    parser.add_argument('--metrics', help=u'файл для счётчиков турнира в формате Prometheus (- для вывода в консоль)')
+    parser.add_argument('--events', help=u'файл журнала событий в формате JSON lines '
+                                         u'(у процессов пула - с суффиксом .pid)')
+    parser.add_argument('--events-level', choices=['move', 'game'], default='move',
+                        help=u'move - каждый ход и итоги игр, game - только итоги игр')
+    args = parser.parse_args()
+    if args.lazy and (args.players < 2 or args.players & (args.players - 1)):
+        parser.error(u'с --lazy число игроков должно быть степенью двойки')
+    if args.build_layout_pools:
+        build_layout_pools(args.build_layout_pools, args.pool_size)
+        raise SystemExit
+    if args.layout_pools:
+        use_layout_pools(args.layout_pools)
+    if args.evaluate:
+        evaluator = StrategyEvaluator(args.workers, args.seed, precision=args.precision, max_games=args.max_games)
+        played = evaluator.run()
+        info(u'Сыграно партий: %s из %s возможных', played, len(evaluator.results) * evaluator.max_games)
+        evaluator.report()
+        raise SystemExit
+    turnaiment_player_counter = args.players
     info(u'Начало турнира')
-    STRATEGY_QUOTA = [y for y in ["for_1_ship_left",
-                                  "for_1_ship_right",
-                                  "for_1_ship_top",
-                                  "for_1_ship_bottom",
-                                  "for_1_ship_center_horisontal",
-                                  "for_1_ship_center_vertical",
-                                  "for_1_ship_36",
-                                  "random_12"] for x in range(int(turnaiment_player_counter / 8))]
-    shuffle(STRATEGY_QUOTA)
-    tur_player_list = [Player() for player in range(turnaiment_player_counter)]
-    # info(u'Список игроков: %s', ", ".join([x.player_name for x in tur_player_list]))
-    tur_player_list_next_iter = []
-    while len(tur_player_list) != 1:
-        for player_ind in range(1, len(tur_player_list), 2):
-            winner = Game(tur_player_list[player_ind - 1], tur_player_list[player_ind]).game()
-            tur_player_list_next_iter.append(winner)
-        tur_player_list = copy(tur_player_list_next_iter)
-        tur_player_list_next_iter = []
+    if args.metrics:
+        metrics = Metrics()
+    if not args.lazy:
+        random.seed(args.seed)
+        fill_strategy_quota(turnaiment_player_counter)
+        with metrics.timer('setup'):
+            tur_player_list = [Player() for player in range(turnaiment_player_counter)]
+        # info(u'Список игроков: %s', ", ".join([x.player_name for x in tur_player_list]))
+    event_log = None
+    if args.events:
+        event_log = args.events, MOVE if args.events_level == 'move' else GAME
+        setup_event_log(*event_log)
+    runner = TournamentRunner(args.workers, args.seed, args.replay, metrics, args.layout_pools, event_log)
+    if args.csv:
+        runner.stats.writers.append(CsvGameWriter(args.csv, TournaimentStatistic.COLUMNS))
+    if args.columnar:
+        runner.stats.writers.append(ChunkedColumnWriter(args.columnar, TournaimentStatistic.COLUMNS))
+    if args.lazy:
+        champion = LazyBracket(runner, turnaiment_player_counter).run()
     else:
-        info(u'Турнир выйграл: %s, набрал очков: %s', tur_player_list[0].player_name,
-             tur_player_list[0].stat.tur_scores)
-    med_step_all, med_step_win, med_step_looser, med_score_looser = tour_stats.count_middles()
+        champion = runner.run(tur_player_list)
+    runner.stats.close_writers()
+    tour_stats = runner.stats
+    info(u'Турнир выйграл: %s, набрал очков: %s', champion.player_name,
+         champion.stat.tur_scores)
+    with runner.metrics.timer('stats'):
+        med_step_all, med_step_win, med_step_looser, med_score_looser = tour_stats.count_middles()
+        res_strat = tour_stats.startegy_effect()
     info(
         u'Статистика: \n\t1. Среднее количесво ходов (всех игроков): %.2f,\n\t2. Среднее количество ходов выйгравших игроков: %.2f,\n\t3. Среднее количество ходов проигравших игроков: %.2f,\n\t4. Среднее количество очков, которое набрали проигравшие: %.2f',
         med_step_all, med_step_win, med_step_looser, med_score_looser)
-    res_strat = tour_stats.startegy_effect()
     for pl_stat in res_strat.keys():
         info(u'%s:', pl_stat)
-        bf = []
-        for strategy_com in res_strat[pl_stat]:
-            if strategy_com not in bf:
-                bf.append(strategy_com)
-                info(u'%s: %s', ", ".join(strategy_com), res_strat[pl_stat].count(strategy_com))
+        for strategy_com, count in res_strat[pl_stat]:
+            info(u'%s: %s', ", ".join(strategy_com), count)
+    if args.metrics:
+        export(runner.metrics, args.metrics)
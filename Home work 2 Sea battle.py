@@ -1,6 +1,7 @@
 from random import randint
 from internal_logic import *
 from time import sleep
+from fleet_placement import get_placer
 
 class Ship:
     def __init__(self, ship_type, cord, halo):
@@ -73,31 +74,17 @@ class Game:
 
     @staticmethod
     def random_board(hid=True):
-        while True:
-            board = Board(hid)
-            direction = ["hor", "ver"]
-            # Требуемое кол-во кораблей каждого типа.
-            required_number_ships_type = [(3, 1), (2, 2), (1, 4)]  
-
-            for type in required_number_ships_type:
-                flag = False
-                repeat = 0
-                # Текущее кол-во кораблей каждого типа.
-                current_number_ships = 0
-
-                while current_number_ships != type[1]:
-                    try:
-                        board.add_ship(Ship(type[0], Dot(randint(1, 6), randint(1, 6)), direction[randint(0, 1)]))
-                        current_number_ships = len(list(filter(lambda x: x.len_ship == type[0], board.list_ship)))
-                    except (BoardOutException, ShipPositionException):
-                        repeat += 1
-                        if repeat == 5 and len(board.list_ship) != 7:
-                            flag = True
-                            break
-                if flag:
-                    break
-            if len(board.list_ship) == 7:
-                break
+        board = Board(hid)
+        direction = ["hor", "ver"]
+        # Требуемое кол-во кораблей каждого типа.
+        required_number_ships_type = [(3, 1), (2, 2), (1, 4)]
+        ships_types = [length for length, count in required_number_ships_type
+                       for _ in range(count)]
+
+        # Позиции выбираются из заранее посчитанных допустимых,
+        # координаты на доске начинаются с 1.
+        for length, x, y, d in get_placer(6, ships_types).place():
+            board.add_ship(Ship(length, Dot(x + 1, y + 1), direction[d]))
 
         return board
 
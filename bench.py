@@ -0,0 +1,315 @@
+"""Бенчмарки горячих путей: генерация досок, выстрелы, партии, турниры,
+проверка победителя в крестиках-ноликах.
+
+    python bench.py                          # таблица в консоль
+    python bench.py --json results.json      # машиночитаемый результат
+    python bench.py --save-baseline bench_baseline.json
+    python bench.py --baseline bench_baseline.json --threshold 0.25
+
+При сравнении с базовой линией код выхода 1, если хотя бы один замер
+медленнее базового больше чем на threshold (по медиане). Бенчмарки
+HW_2_SEAWAR пропускаются, если нет модуля service.
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+from contextlib import contextmanager
+from time import perf_counter
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+# Размеры досок и флоты для морского боя (HW Sea Battle)
+SEA_CONFIGS = [
+    (6, [3, 2, 2, 1, 1, 1, 1]),
+    (8, [4, 3, 2, 2, 1, 1, 1]),
+    (10, [4, 3, 3, 2, 2, 2, 1, 1, 1, 1]),
+]
+# Флоты для HW_2_SEAWAR: доска там всегда 10x10, а комбинации
+# из service есть только для кораблей до трёх палуб
+SEAWAR_FLEETS = [
+    [3, 2, 2, 1, 1, 1, 1],
+    [3, 3, 2, 2, 2, 1, 1, 1, 1],
+]
+SEAWAR_PLAYERS = [16, 64]
+# (размер, сколько в ряд) для LineBoard
+LINE_CONFIGS = [(3, 3), (7, 4), (15, 5)]
+SEED = 12345
+
+
+def load_module(name, filename):
+    """Импорт файла по пути: у части скриптов в имени пробелы"""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@contextmanager
+def override(module, **values):
+    """Временно подменяет константы модуля (размер доски, флот)"""
+    saved = {name: getattr(module, name) for name in values}
+    for name, value in values.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(module, name, value)
+
+
+def fleet_name(fleet):
+    return ''.join(str(length) for length in fleet)
+
+
+class Bench(object):
+    """Набор замеров. Каждый замер - функция run(number), которая сама
+    готовит данные, измеряет только нужную часть и возвращает
+    (секунды, число операций). Строки прогресса пишутся в out"""
+
+    def __init__(self, repeat=5, number=20, only=None, out=sys.stdout):
+        self.repeat = repeat
+        self.number = number
+        self.only = only
+        self.out = out
+        self.results = {}
+
+    def measure(self, name, run, number=None):
+        if self.only and self.only not in name:
+            return
+        number = number or self.number
+        random.seed(SEED)
+        run(1)
+        per_op = []
+        for _ in range(self.repeat):
+            random.seed(SEED)
+            elapsed, ops = run(number)
+            per_op.append(elapsed / ops * 1e6)
+        self.results[name] = {
+            'median_us': statistics.median(per_op),
+            'best_us': min(per_op),
+            'ops': ops,
+            'repeat': self.repeat,
+        }
+        print(f'{name:<58} {self.results[name]["median_us"]:>12.2f} us/op', file=self.out)
+
+
+def timed(func, number):
+    started = perf_counter()
+    for _ in range(number):
+        func()
+    return perf_counter() - started, number
+
+
+def bench_sea_battle(bench):
+    sea = load_module('hw_sea_battle', 'HW Sea Battle.py')
+    for size, fleet in SEA_CONFIGS:
+        with override(sea, BOARD_SIZE=size, SHIPS_TYPES=fleet):
+            for board_name, board_cls in sea.BOARD_CLASSES.items():
+                label = f'{board_name},size={size},fleet={fleet_name(fleet)}'
+                sink = sea.NullSink()
+                game = sea.SimulationGame(board_cls, sink)
+
+                bench.measure(f'sea.random_board[{label}]',
+                              lambda number: timed(lambda: sea.Game.random_board(board_cls, sink), number))
+                bench.measure(f'sea.make_board[{label}]',
+                              lambda number: timed(game.make_board, number))
+
+                def shots(number):
+                    boards = [game.make_board() for _ in range(number)]
+                    cells = [sea.Dot(x, y) for x in range(size) for y in range(size)]
+                    random.shuffle(cells)
+                    ops = 0
+                    started = perf_counter()
+                    for board in boards:
+                        for dot in cells:
+                            try:
+                                board.shot(dot)
+                                ops += 1
+                            except sea.BoardException:
+                                pass
+                    return perf_counter() - started, ops
+
+                bench.measure(f'sea.Board.shot[{label}]', shots)
+
+                for ai_name, ai_cls in sea.AI_CLASSES.items():
+                    def games(number):
+                        return sea.simulate(number, board_cls, sink, ai_cls, ai_cls)[1], number
+
+                    bench.measure(f'sea.game[{label},ai={ai_name}]', games,
+                                  max(1, bench.number // 4))
+
+
+def bench_seawar(bench):
+    try:
+        import service  # noqa: F401
+    except ImportError:
+        print('HW_2_SEAWAR: нет модуля service, пропускаем', file=bench.out)
+        return
+    seawar = load_module('hw_2_seawar', 'HW_2_SEAWAR.py')
+    for fleet in SEAWAR_FLEETS:
+        with override(seawar, SHIPS_TYPES=fleet):
+            label = f'fleet={fleet_name(fleet)}'
+            seawar.fill_strategy_quota(len(seawar.STRATEGY_LIST))
+            players = [seawar.Player() for _ in seawar.STRATEGY_LIST]
+
+            def create_ships(number):
+                started = perf_counter()
+                for index in range(number):
+                    players[index % len(players)].create_ships()
+                return perf_counter() - started, number
+
+            bench.measure(f'seawar.Player.create_ships[{label}]', create_ships)
+
+            def data_cleaner(number):
+                elapsed = 0.0
+                ops = 0
+                for index in range(number):
+                    player = players[index % len(players)]
+                    strategy = player.strategy
+                    strategy.reload()
+                    for ship in player.ships:
+                        started = perf_counter()
+                        strategy.data_cleaner(ship.cord, ship.halo)
+                        elapsed += perf_counter() - started
+                        ops += 1
+                return elapsed, ops
+
+            bench.measure(f'seawar.PlayerStrategy.data_cleaner[{label}]', data_cleaner)
+
+            for player_count in SEAWAR_PLAYERS:
+                def tournament_round(number):
+                    elapsed = 0.0
+                    for _ in range(number):
+                        seawar.fill_strategy_quota(player_count)
+                        player_list = [seawar.Player() for _ in range(player_count)]
+                        runner = seawar.TournamentRunner(workers=1, seed=SEED)
+                        started = perf_counter()
+                        runner.play_round(player_list, 0)
+                        elapsed += perf_counter() - started
+                    return elapsed, number * player_count // 2
+
+                bench.measure(f'seawar.tournament_round[{label},players={player_count}]', tournament_round,
+                              max(1, bench.number // 10))
+
+
+def bench_tictactoe(bench):
+    import gomoku
+    import homework_play_game
+    import tictactoe_ai
+
+    boards = [board[:] for board in tictactoe_ai.reachable_positions()]
+
+    def get_winner(number):
+        started = perf_counter()
+        for _ in range(number):
+            for board in boards:
+                homework_play_game.get_winner(board, homework_play_game.winning_combinations)
+        return perf_counter() - started, number * len(boards)
+
+    bench.measure(f'ttt.get_winner[size=3,boards={len(boards)}]', get_winner)
+
+    if tictactoe_ai.np is not None:
+        array = tictactoe_ai.boards_to_array(boards)
+        bench.measure(f'ttt.get_winners[size=3,boards={len(boards)}]',
+                      lambda number: (timed(lambda: tictactoe_ai.get_winners(array), number)[0],
+                                      number * len(boards)))
+
+    for size, k in LINE_CONFIGS:
+        def line_moves(number):
+            ops = 0
+            elapsed = 0.0
+            for _ in range(number):
+                board = gomoku.LineBoard(size, k)
+                order = list(range(size * size))
+                random.shuffle(order)
+                sign = 'X'
+                started = perf_counter()
+                for index in order:
+                    if board.move(index, sign):
+                        break
+                    sign = 'O' if sign == 'X' else 'X'
+                elapsed += perf_counter() - started
+                ops += len(board.moves)
+            return elapsed, ops
+
+        bench.measure(f'gomoku.LineBoard.move[size={size},k={k}]', line_moves)
+
+
+SUITES = {
+    'sea': bench_sea_battle,
+    'seawar': bench_seawar,
+    'ttt': bench_tictactoe,
+}
+
+
+def compare(results, baseline, threshold, out=sys.stdout):
+    """Список регрессий: (имя, было, стало, отношение)"""
+    regressions = []
+    for name, result in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None:
+            continue
+        ratio = result['median_us'] / base['median_us']
+        marker = 'REGRESSION' if ratio > 1 + threshold else ''
+        print(f'{name:<58} {base["median_us"]:>10.2f} -> {result["median_us"]:>10.2f} us/op '
+              f'({ratio:>5.2f}x) {marker}', file=out)
+        if marker:
+            regressions.append((name, base['median_us'], result['median_us'], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Бенчмарки морского боя и крестиков-ноликов')
+    parser.add_argument('--suite', choices=SUITES, action='append',
+                        help='какие наборы запускать (по умолчанию все)')
+    parser.add_argument('--filter', help='только замеры, в имени которых есть эта строка')
+    parser.add_argument('--repeat', type=int, default=5, help='повторов каждого замера')
+    parser.add_argument('--number', type=int, default=20, help='операций в одном повторе')
+    parser.add_argument('--json', help='записать результаты в JSON-файл (- для stdout)')
+    parser.add_argument('--baseline', help='сравнить с сохранёнными результатами')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='допустимое замедление относительно базовой линии (0.25 = 25%%)')
+    parser.add_argument('--save-baseline', help='сохранить результаты как базовую линию')
+    args = parser.parse_args(argv)
+
+    # Турнир пишет в лог каждый раунд
+    logging.disable(logging.INFO)
+    # Если JSON идёт в stdout, таблица уходит в stderr, чтобы не портить JSON
+    out = sys.stderr if '-' in (args.json, args.save_baseline) else sys.stdout
+    bench = Bench(args.repeat, args.number, args.filter, out)
+    for suite in args.suite or SUITES:
+        SUITES[suite](bench)
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'number': args.number,
+        'results': bench.results,
+    }
+    for path in filter(None, (args.json, args.save_baseline)):
+        if path == '-':
+            json.dump(report, sys.stdout, indent=2, sort_keys=True)
+            print()
+        else:
+            with open(path, 'w') as json_file:
+                json.dump(report, json_file, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as json_file:
+            baseline = json.load(json_file)['results']
+        regressions = compare(bench.results, baseline, args.threshold, out)
+        if regressions:
+            print(f'Замедлились {len(regressions)} замеров больше чем на {args.threshold:.0%}', file=out)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
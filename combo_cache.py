@@ -0,0 +1,80 @@
+import service
+from random import choice
+
+
+class CombinationSet(object):
+    """Неизменяемые комбинации расстановки одной стратегии: для каждого типа
+    корабля - кортеж комбинаций, комбинация - кортеж клеток (x, y)"""
+
+    def __init__(self, combinations):
+        self.combinations = dict((ship, tuple(tuple(tuple(crd) for crd in crd_pack) for crd_pack in crd_packs))
+                                 for ship, crd_packs in combinations.items())
+        # Обратный индекс: тип корабля -> клетка -> маска комбинаций, в которые входит клетка
+        self.cell_index = {}
+        for ship, crd_packs in self.combinations.items():
+            index = self.cell_index[ship] = {}
+            for ind, crd_pack in enumerate(crd_packs):
+                for crd in crd_pack:
+                    index[crd] = index.get(crd, 0) | 1 << ind
+        # Маска "доступны все комбинации" для каждого типа корабля
+        self.full = dict((ship, (1 << len(crd_packs)) - 1) for ship, crd_packs in self.combinations.items())
+
+    def keys(self):
+        return self.combinations.keys()
+
+
+_cache = {}
+
+
+def get_combinations(ships_strategy_collocation):
+    """service.gen_cord считается один раз на стратегию, результат общий для всех игроков"""
+    if ships_strategy_collocation not in _cache:
+        _cache[ships_strategy_collocation] = CombinationSet(service.gen_cord(ships_strategy_collocation))
+    return _cache[ships_strategy_collocation]
+
+
+class CombinationView(object):
+    """Комбинации, ещё доступные игроку: по каждому типу корабля битовая маска
+    индексов в общем CombinationSet вместо собственной копии списков"""
+
+    def __init__(self, ships_strategy_collocation):
+        self.ships_strategy_collocation = ships_strategy_collocation
+        self.combination_set = get_combinations(ships_strategy_collocation)
+        self.reset()
+
+    def __getstate__(self):
+        # Общий набор не передаётся в другие процессы, там он берётся из своего кэша
+        return self.ships_strategy_collocation, self.available
+
+    def __setstate__(self, state):
+        self.ships_strategy_collocation, self.available = state
+        self.combination_set = get_combinations(self.ships_strategy_collocation)
+
+    def reset(self):
+        self.available = dict(self.combination_set.full)
+
+    def keys(self):
+        return self.combination_set.keys()
+
+    def indexes(self, ship):
+        mask = self.available[ship]
+        return [ind for ind in range(mask.bit_length()) if mask >> ind & 1]
+
+    def __getitem__(self, ship):
+        """Доступные комбинации типа корабля в исходном виде (списки координат)"""
+        crd_packs = self.combination_set.combinations[ship]
+        return [[list(crd) for crd in crd_packs[ind]] for ind in self.indexes(ship)]
+
+    def choice(self, ship):
+        """Случайная доступная комбинация в виде списка координат"""
+        crd_pack = self.combination_set.combinations[ship][choice(self.indexes(ship))]
+        return [list(crd) for crd in crd_pack]
+
+    def discard_cells(self, cells):
+        """Убирает все комбинации, задевающие хотя бы одну из клеток cells"""
+        cells = [tuple(crd) for crd in cells]
+        for ship, index in self.combination_set.cell_index.items():
+            conflicts = 0
+            for crd in cells:
+                conflicts |= index.get(crd, 0)
+            self.available[ship] &= ~conflicts
@@ -0,0 +1,97 @@
+from collections import Counter
+from random import choice
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Во сколько раз положение корабля через уже подбитые клетки весомее обычного
+HIT_WEIGHT = 20
+
+
+def _window_sums(values, length):
+    # Суммы по всем окнам длины length вдоль строк (скользящее окно через cumsum)
+    sums = np.zeros((values.shape[0], values.shape[1] + 1), dtype=np.int64)
+    np.cumsum(values, axis=1, out=sums[:, 1:])
+    return sums[:, length:] - sums[:, :-length]
+
+
+def _spread(weights, length):
+    # Каждое окно отдаёт свой вес всем length клеткам, которые оно накрывает
+    return _window_sums(np.pad(weights, ((0, 0), (length - 1, length - 1))), length)
+
+
+def _numpy_scores(size, blocked, hits, lengths):
+    blocked_grid = np.zeros((size, size), dtype=np.int64)
+    hit_grid = np.zeros((size, size), dtype=np.int64)
+    if blocked:
+        blocked_grid[tuple(zip(*blocked))] = 1
+    if hits:
+        hit_grid[tuple(zip(*hits))] = 1
+    target = bool(hits)
+    scores = np.zeros((size, size), dtype=np.int64)
+    # Вертикальные положения считаются на транспонированной доске
+    for transpose in (False, True):
+        blocked_view = blocked_grid.T if transpose else blocked_grid
+        hit_view = hit_grid.T if transpose else hit_grid
+        for length, count in Counter(lengths).items():
+            if length > size or (transpose and length == 1):
+                continue
+            free = _window_sums(blocked_view, length) == 0
+            if target:
+                weights = free * _window_sums(hit_view, length) * (HIT_WEIGHT * count)
+            else:
+                weights = free * count
+            spread = _spread(weights, length)
+            scores += spread.T if transpose else spread
+    scores[(blocked_grid | hit_grid) == 1] = 0
+    return scores
+
+
+def _python_scores(size, blocked, hits, lengths):
+    blocked = set(blocked)
+    hits = set(hits)
+    target = bool(hits)
+    scores = [[0] * size for _ in range(size)]
+    for length, count in Counter(lengths).items():
+        for dx, dy in (((1, 0),) if length == 1 else ((1, 0), (0, 1))):
+            for x in range(size - dx * (length - 1)):
+                for y in range(size - dy * (length - 1)):
+                    cells = [(x + dx * i, y + dy * i) for i in range(length)]
+                    if any(cell in blocked for cell in cells):
+                        continue
+                    weight = count
+                    if target:
+                        weight *= sum(cell in hits for cell in cells) * HIT_WEIGHT
+                    for cx, cy in cells:
+                        scores[cx][cy] += weight
+    for x, y in blocked | hits:
+        scores[x][y] = 0
+    return scores
+
+
+def shot_scores(size, blocked, hits, lengths):
+    """Для каждой клетки - сколько допустимых положений оставшихся кораблей её накрывают.
+    blocked - клетки, где корабля быть не может (промахи, потопленные корабли и их ореолы),
+    hits - попадания по ещё не потопленным кораблям; если они есть, считаются только
+    положения через них (режим добивания). Возвращает таблицу scores[x][y]"""
+    if np is not None:
+        return _numpy_scores(size, blocked, hits, lengths).tolist()
+    return _python_scores(size, blocked, hits, lengths)
+
+
+def best_cell(size, blocked, hits, lengths):
+    """Клетка с наибольшей оценкой, при равенстве - случайная из лучших"""
+    if np is not None:
+        scores = _numpy_scores(size, blocked, hits, lengths)
+        best = scores.max()
+        candidates = [divmod(int(cell), size) for cell in np.flatnonzero(scores == best)]
+    else:
+        scores = _python_scores(size, blocked, hits, lengths)
+        best = max(max(row) for row in scores)
+        candidates = [(x, y) for x in range(size) for y in range(size) if scores[x][y] == best]
+    if best == 0:
+        used = set(blocked) | set(hits)
+        candidates = [(x, y) for x in range(size) for y in range(size) if (x, y) not in used]
+    return choice(candidates)
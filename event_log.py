@@ -0,0 +1,83 @@
+import json
+import logging
+import os
+from logging.handlers import MemoryHandler, QueueHandler, QueueListener, RotatingFileHandler
+from multiprocessing.util import Finalize
+from queue import SimpleQueue
+
+# Уровни событий: каждый ход и итог игры
+MOVE = logging.DEBUG
+GAME = logging.INFO
+
+# Логгер событий не передаёт записи корневому и по умолчанию выключен:
+# в игре событие собирается, только если EVENTS.isEnabledFor(уровень)
+EVENTS = logging.getLogger('seabattle.events')
+EVENTS.propagate = False
+EVENTS.setLevel(logging.WARNING)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON: время, уровень, имя события и поля из extra={'event': {...}}"""
+
+    def format(self, record):
+        event = dict(time=record.created, level=record.levelname, event=record.msg)
+        event.update(getattr(record, 'event', {}))
+        return json.dumps(event, ensure_ascii=False)
+
+
+class RawQueueHandler(QueueHandler):
+    """Кладёт запись в очередь как есть: форматирование и запись в файл
+    происходят в потоке QueueListener, а не в игровом цикле"""
+
+    def __init__(self, queue):
+        super().__init__(queue)
+        # После fork очередь без слушателя только копила бы записи
+        self.pid = os.getpid()
+
+    def prepare(self, record):
+        return record
+
+    def emit(self, record):
+        if os.getpid() == self.pid:
+            self.enqueue(record)
+
+
+class EventLog(object):
+    """Фоновая запись событий в ротируемый файл JSON lines: записи из очереди
+    копятся пачками по batch_size (MemoryHandler) и пишутся в RotatingFileHandler"""
+
+    def __init__(self, path, level=MOVE, max_bytes=64 << 20, backup_count=5, batch_size=1024):
+        self.level = level
+        self.queue = SimpleQueue()
+        self.file_handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                                encoding='utf-8')
+        self.file_handler.setFormatter(JsonLinesFormatter())
+        self.batch_handler = MemoryHandler(batch_size, flushLevel=logging.CRITICAL, target=self.file_handler)
+        self.listener = QueueListener(self.queue, self.batch_handler)
+        self.handler = RawQueueHandler(self.queue)
+
+    def start(self):
+        for handler in list(EVENTS.handlers):
+            EVENTS.removeHandler(handler)
+        EVENTS.addHandler(self.handler)
+        EVENTS.setLevel(self.level)
+        self.listener.start()
+
+    def stop(self):
+        """Выключает события и дописывает в файл всё, что осталось в очереди"""
+        if self.listener._thread is None:
+            return
+        EVENTS.removeHandler(self.handler)
+        EVENTS.setLevel(logging.WARNING)
+        self.listener.stop()
+        self.batch_handler.close()
+        self.file_handler.close()
+
+
+def setup_event_log(path, level=MOVE, **kwargs):
+    """Включает запись событий в path. Файл дописывается и при выходе
+    из процесса, в том числе из процесса пула"""
+    event_log = EventLog(path, level, **kwargs)
+    event_log.start()
+    Finalize(event_log, event_log.stop, exitpriority=10)
+    return event_log
@@ -0,0 +1,289 @@
+from functools import lru_cache
+import mmap
+import struct
+from random import choice, randrange, shuffle
+
+from metrics import NULL_METRICS
+
+# Смещения соседних клеток для ореола корабля
+NEIGHBOURS = [(-1, -1), (0, -1), (1, -1), (-1, 0),
+              (1, 0), (-1, 1), (0, 1), (1, 1)]
+
+
+@lru_cache(maxsize=None)
+def ship_masks(length: int, x: int, y: int, direction: int,
+               size: int) -> tuple[int, int]:
+    # Маска палуб и маска ореола корабля; (0, 0) - если корабль не влезает
+    dx, dy = (1, 0) if direction == 0 else (0, 1)
+    mask = 0
+    for i in range(length):
+        cx, cy = x + dx * i, y + dy * i
+        if not (0 <= cx < size and 0 <= cy < size):
+            return 0, 0
+        mask |= 1 << (cx * size + cy)
+    halo = 0
+    for i in range(length):
+        for nx, ny in NEIGHBOURS:
+            cx, cy = x + dx * i + nx, y + dy * i + ny
+            if 0 <= cx < size and 0 <= cy < size:
+                halo |= 1 << (cx * size + cy)
+    return mask, halo & ~mask
+
+
+class FleetPlacementError(Exception):
+    def __str__(self) -> str:
+        return '\n\tФлот невозможно разместить на доске такого размера!\n'
+
+
+class FleetPlacer():
+    # Расстановка флота без случайных попыток: для каждой длины корабля
+    # заранее считаются все допустимые позиции (маска палуб и маска
+    # палуб вместе с ореолом), а флот собирается перебором с возвратом
+    # по ещё свободным клеткам. Клетка (x, y) - бит x * size + y,
+    # направление 0 - корабль растёт по x, 1 - по y.
+
+    def __init__(self, size: int, ship_types: list[int],
+                 cells: dict[int, list] = None) -> None:
+        # cells - свои допустимые положения кораблей: длина -> список
+        # наборов клеток (x, y); по умолчанию - все положения на доске
+        self.size = size
+        self.ship_types = sorted(ship_types, reverse=True)
+        if cells is None:
+            cells = {length: self._lines(length)
+                     for length in set(self.ship_types)}
+        self.positions = {length: [self._position(ship) for ship in cells[length]]
+                          for length in set(self.ship_types)}
+        # Сколько клеток нужно под оставшиеся корабли начиная с i-го
+        self.tail_cells = [sum(self.ship_types[i:])
+                           for i in range(len(self.ship_types) + 1)]
+
+    def _lines(self, length: int) -> list[list[tuple[int, int]]]:
+        lines = list()
+        directions = [0] if length == 1 else [0, 1]
+        for direction in directions:
+            dx, dy = (1, 0) if direction == 0 else (0, 1)
+            for x in range(self.size - dx * (length - 1)):
+                for y in range(self.size - dy * (length - 1)):
+                    lines.append([(x + dx * i, y + dy * i) for i in range(length)])
+        return lines
+
+    def _position(self, ship: list) -> tuple[int, int, int, int, int]:
+        # (x, y, направление, маска палуб, маска палуб с ореолом)
+        ship = sorted(tuple(cell) for cell in ship)
+        x, y = ship[0]
+        direction = 0 if len(ship) == 1 or ship[1][0] != x else 1
+        mask, halo = ship_masks(len(ship), x, y, direction, self.size)
+        return x, y, direction, mask, mask | halo
+
+    def place(self, metrics=NULL_METRICS) -> list[tuple[int, int, int, int]]:
+        # Возвращает [(длина, x, y, направление), ...] для всего флота.
+        # В metrics считаются попытки поставить корабль, откаты
+        # и размеры списков допустимых позиций, если они включены
+        measure = metrics.enabled
+        full = (1 << (self.size * self.size)) - 1
+        dead_ends = set()
+        placed = list()
+
+        def fill(index: int, blocked: int) -> bool:
+            if index == len(self.ship_types):
+                return True
+            if (index, blocked) in dead_ends:
+                return False
+            if bin(full & ~blocked).count('1') < self.tail_cells[index]:
+                dead_ends.add((index, blocked))
+                return False
+            length = self.ship_types[index]
+            candidates = [position for position in self.positions[length]
+                          if not position[3] & blocked]
+            if measure:
+                metrics.observe('placement_candidates', len(candidates))
+            shuffle(candidates)
+            for x, y, direction, _, zone in candidates:
+                if measure:
+                    metrics.incr('placement_attempts')
+                placed.append((length, x, y, direction))
+                if fill(index + 1, blocked | zone):
+                    return True
+                placed.pop()
+                if measure:
+                    metrics.incr('placement_restarts')
+            dead_ends.add((index, blocked))
+            return False
+
+        if not fill(0, 0):
+            raise FleetPlacementError()
+        return placed
+
+
+    def sample_layouts(self, count: int, steps: int = None,
+                       restart: int = 1000) -> list[int]:
+        # До count разных расстановок в виде масок палуб. Расстановки
+        # равновероятны: цепь Метрополиса переставляет случайный корабль
+        # в случайное положение той же длины, если оно не задевает
+        # остальные. Предложение симметрично, поэтому цепь сходится
+        # к равномерному распределению. Между выборками steps шагов,
+        # каждые restart выборок цепь начинается заново с place().
+        # Если разных расстановок меньше count, вернутся все найденные:
+        # выборка останавливается, когда restart выборок подряд не дали
+        # новой расстановки.
+        steps = steps or 10 * len(self.ship_types)
+        seen = set()
+        layouts = list()
+        samples = 0
+        stale = 0
+        index = {length: {position[:3]: i for i, position
+                          in enumerate(self.positions[length])}
+                 for length in self.positions}
+        while len(layouts) < count and samples < 20 * count and stale < restart:
+            chain = [self.positions[length][index[length][(x, y, direction)]]
+                     for length, x, y, direction in self.place()]
+            for _ in range(min(restart, 20 * count - samples)):
+                for _ in range(steps):
+                    ship = randrange(len(chain))
+                    candidate = choice(self.positions[self.ship_types[ship]])
+                    others = 0
+                    for other, position in enumerate(chain):
+                        if other != ship:
+                            others |= position[4]
+                    if not candidate[3] & others:
+                        chain[ship] = candidate
+                samples += 1
+                mask = 0
+                for position in chain:
+                    mask |= position[3]
+                if mask not in seen:
+                    seen.add(mask)
+                    layouts.append(mask)
+                    stale = 0
+                    if len(layouts) == count:
+                        break
+                else:
+                    stale += 1
+                    if stale == restart:
+                        break
+        return layouts
+
+
+# Файл пула расстановок: POOL_MAGIC, заголовок POOL_HEADER (размер доски,
+# число кораблей, число расстановок), длины кораблей по байту, затем
+# расстановки - маски палуб по (size * size + 7) // 8 байт (little-endian)
+POOL_MAGIC = b'SBPOOL1\n'
+POOL_HEADER = struct.Struct('<HHI')
+
+
+def write_pool(path: str, size: int, ship_types: list[int], layouts: list[int]) -> None:
+    record_size = (size * size + 7) // 8
+    ship_types = sorted(ship_types, reverse=True)
+    with open(path, 'wb') as pool_file:
+        pool_file.write(POOL_MAGIC + POOL_HEADER.pack(size, len(ship_types), len(layouts))
+                        + bytes(ship_types))
+        for mask in layouts:
+            pool_file.write(mask.to_bytes(record_size, 'little'))
+
+
+class LayoutPool():
+    # Готовые расстановки из файла write_pool, отображённого в память:
+    # случайная расстановка - один срез mmap. Умеет place(), как
+    # FleetPlacer, поэтому подставляется вместо него (см. use_pool).
+
+    def __init__(self, path: str) -> None:
+        with open(path, 'rb') as pool_file:
+            self.data = mmap.mmap(pool_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(POOL_MAGIC)] != POOL_MAGIC:
+            self.data.close()
+            raise ValueError(f'{path} - не файл пула расстановок')
+        offset = len(POOL_MAGIC)
+        self.size, ship_count, self.count = POOL_HEADER.unpack_from(self.data, offset)
+        offset += POOL_HEADER.size
+        self.ship_types = list(self.data[offset:offset + ship_count])
+        self.offset = offset + ship_count
+        self.record_size = (self.size * self.size + 7) // 8
+
+    def __len__(self) -> int:
+        return self.count
+
+    def mask(self, index: int) -> int:
+        start = self.offset + index * self.record_size
+        return int.from_bytes(self.data[start:start + self.record_size], 'little')
+
+    def ships(self, index: int) -> list[list[tuple[int, int]]]:
+        # Корабли расстановки - списки клеток, от длинных к коротким.
+        # Корабли не касаются друг друга, поэтому каждый - отдельная
+        # связная группа палуб.
+        mask = self.mask(index)
+        ships = list()
+        while mask:
+            low = mask & -mask
+            stack = [divmod(low.bit_length() - 1, self.size)]
+            mask ^= low
+            ship = list()
+            while stack:
+                x, y = stack.pop()
+                ship.append((x, y))
+                for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                    if 0 <= nx < self.size and 0 <= ny < self.size:
+                        bit = 1 << (nx * self.size + ny)
+                        if mask & bit:
+                            mask ^= bit
+                            stack.append((nx, ny))
+            ships.append(sorted(ship))
+        ships.sort(key=len, reverse=True)
+        return ships
+
+    def layout(self, index: int) -> list[tuple[int, int, int, int]]:
+        layout = list()
+        for ship in self.ships(index):
+            x, y = ship[0]
+            direction = 0 if len(ship) == 1 or ship[1][0] != x else 1
+            layout.append((len(ship), x, y, direction))
+        return layout
+
+    def place(self, metrics=NULL_METRICS) -> list[tuple[int, int, int, int]]:
+        if metrics.enabled:
+            metrics.incr('pool_draws')
+        return self.layout(randrange(self.count))
+
+    def close(self) -> None:
+        self.data.close()
+
+
+# Загруженные пулы: (размер, флот по убыванию) -> LayoutPool
+_pools = dict()
+
+
+def use_pool(path: str) -> LayoutPool:
+    # После этого get_placer для размера и флота пула отдаёт пул
+    pool = LayoutPool(path)
+    _pools[(pool.size, tuple(pool.ship_types))] = pool
+    return pool
+
+
+@lru_cache(maxsize=None)
+def _placer(size: int, ship_types: tuple[int, ...]) -> FleetPlacer:
+    return FleetPlacer(size, list(ship_types))
+
+
+def get_placer(size: int, ship_types: list[int]) -> FleetPlacer:
+    # Позиции считаются один раз на каждую пару (размер, флот);
+    # если для неё загружен пул расстановок - возвращается он
+    key = (size, tuple(sorted(ship_types, reverse=True)))
+    pool = _pools.get(key)
+    if pool is not None:
+        return pool
+    return _placer(*key)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Пул готовых расстановок флота')
+    parser.add_argument('path', help='куда записать пул')
+    parser.add_argument('--size', type=int, default=6, help='размер доски')
+    parser.add_argument('--ships', default='3221111',
+                        help='длины кораблей подряд, например 3221111')
+    parser.add_argument('--count', type=int, default=100000,
+                        help='сколько разных расстановок сгенерировать')
+    args = parser.parse_args()
+    ships = [int(length) for length in args.ships]
+    layouts = FleetPlacer(args.size, ships).sample_layouts(args.count)
+    write_pool(args.path, args.size, ships, layouts)
+    print(f'Расстановок: {len(layouts)}, файл: {args.path}')
@@ -0,0 +1,125 @@
+"""N x N tic-tac-toe with k in a row to win (15 x 15, k = 5 is gomoku).
+
+Instead of rescanning every winning combination after each move, the
+board keeps a counter of 'X' and 'O' stones for every k-cell segment and
+only updates the segments through the last placed cell. Segments still
+open to one side (no opponent stones) are also kept grouped by how many
+stones that side has, so threats() looks only at the segments it needs.
+"""
+
+DIRECTIONS = [(0, 1), (1, 0), (1, 1), (1, -1)]
+
+
+class LineBoard(object):
+
+    def __init__(self, size=15, k=5):
+        if not 1 <= k <= size:
+            raise ValueError(f'k must be between 1 and {size}')
+        self.size = size
+        self.k = k
+        self.cells = [' '] * (size * size)
+        # Every k-cell segment in all four directions, and segments through each cell
+        self.segments = []
+        self.cell_segments = [[] for _ in range(size * size)]
+        for row in range(size):
+            for col in range(size):
+                for d_row, d_col in DIRECTIONS:
+                    end_row, end_col = row + d_row * (k - 1), col + d_col * (k - 1)
+                    if 0 <= end_row < size and 0 <= end_col < size:
+                        segment = tuple((row + d_row * i) * size + col + d_col * i for i in range(k))
+                        for index in segment:
+                            self.cell_segments[index].append(len(self.segments))
+                        self.segments.append(segment)
+        self.counts = {'X': [0] * len(self.segments), 'O': [0] * len(self.segments)}
+        # sign -> [segments with n stones of sign and none of the opponent, n = 0..k]
+        self.open_segments = {sign: [set(range(len(self.segments)))] + [set() for _ in range(k)]
+                              for sign in ('X', 'O')}
+        self.moves = []
+        self.winner = ''
+
+    def index(self, row, col):
+        return row * self.size + col
+
+    def move(self, index, sign):
+        """Places sign on cell index and returns the winner ('' if none yet)"""
+        if self.winner:
+            raise ValueError('The game is already over')
+        if self.cells[index] != ' ':
+            raise ValueError(f'Cell {index} is already taken')
+        self.cells[index] = sign
+        self.moves.append(index)
+        other = 'O' if sign == 'X' else 'X'
+        counts, other_counts = self.counts[sign], self.counts[other]
+        own_open, other_open = self.open_segments[sign], self.open_segments[other]
+        for segment in self.cell_segments[index]:
+            count, other_count = counts[segment], other_counts[segment]
+            if other_count == 0:
+                own_open[count].discard(segment)
+                own_open[count + 1].add(segment)
+            if count == 0:
+                # The segment is no longer open to the opponent
+                other_open[other_count].discard(segment)
+            counts[segment] = count + 1
+            if count + 1 == self.k:
+                self.winner = sign
+        return self.winner
+
+    def undo(self):
+        index = self.moves.pop()
+        sign = self.cells[index]
+        other = 'O' if sign == 'X' else 'X'
+        counts, other_counts = self.counts[sign], self.counts[other]
+        own_open, other_open = self.open_segments[sign], self.open_segments[other]
+        for segment in self.cell_segments[index]:
+            count, other_count = counts[segment] - 1, other_counts[segment]
+            if other_count == 0:
+                own_open[count + 1].discard(segment)
+                own_open[count].add(segment)
+            if count == 0:
+                other_open[other_count].add(segment)
+            counts[segment] = count
+        self.cells[index] = ' '
+        self.winner = ''
+
+    def is_full(self):
+        return len(self.moves) == len(self.cells)
+
+    def threats(self, sign, missing=1):
+        """Empty cells in segments where sign needs only `missing` more stones
+        and the opponent has none (missing=1: cells that win immediately)"""
+        cells = set()
+        if not 0 <= missing <= self.k:
+            return cells
+        for segment in self.open_segments[sign][self.k - missing]:
+            cells.update(index for index in self.segments[segment] if self.cells[index] == ' ')
+        return cells
+
+    def print_state(self):
+        for row in range(self.size):
+            print('|'.join(self.cells[row * self.size:(row + 1) * self.size]))
+
+
+def play_game(size=15, k=5):
+    board = LineBoard(size, k)
+    current_sign = 'X'
+    while not board.winner and not board.is_full():
+        try:
+            row, col = map(int, input(f'Where you want to draw {current_sign}? (row col) ').split())
+        except ValueError:
+            print('Enter two numbers: row and column')
+            continue
+        if not (0 <= row < size and 0 <= col < size):
+            print(f'Row and column must be between 0 and {size - 1}')
+            continue
+        if board.cells[board.index(row, col)] != ' ':
+            print('This cell is already taken')
+            continue
+        board.move(board.index(row, col), current_sign)
+        board.print_state()
+        if board.winner:
+            print(f'We have a winner:{board.winner}')
+        current_sign = 'X' if current_sign == 'O' else 'O'
+
+
+if __name__ == '__main__':
+    play_game()
@@ -1,6 +1,18 @@
 
 # In[ ]:
 
+import os
+
+from tictactoe_ai import DEFAULT_TABLE_PATH, best_move, use_table
+
+# With a prebuilt outcome table (python tictactoe_ai.py build) every computer
+# move is a single lookup; without it best_move falls back to the search
+if os.path.exists(DEFAULT_TABLE_PATH):
+    try:
+        use_table(DEFAULT_TABLE_PATH)
+    except ValueError as e:
+        print(f'Ignoring outcome table: {e}')
+
 board = [' ', ' ', ' ', ' ', ' ', ' ', ' ', ' ', ' ']
 
 # In[ ]:
@@ -14,7 +26,8 @@ def print_state(state):
 
 # In[ ]:
 
-print_state(board)
+if __name__ == '__main__':
+    print_state(board)
 
 # In[ ]:
 
@@ -27,10 +40,14 @@ def get_winner(state, combinations):
 
 # In[ ]:
 
-def play_game(board):
+def play_game(board, computer_sign=None):
     current_sign = 'X'
-    while(get_winner(board, winning_combinations)==''):
-        index = int(input(f'Where you want to draw {current_sign}?'))
+    while(get_winner(board, winning_combinations)=='' and ' ' in board):
+        if current_sign == computer_sign:
+            index = best_move(board)
+            print(f'Computer draws {current_sign} at {index}')
+        else:
+            index = int(input(f'Where you want to draw {current_sign}?'))
         board[index] = current_sign
         
         print_state(board)
@@ -44,11 +61,13 @@ def play_game(board):
 
 # In[ ]:
 
-play_game(board)
+if __name__ == '__main__':
+    play_game(board)
 
 # In[ ]:
 
-play_game(board)
+if __name__ == '__main__':
+    play_game([' '] * 9, computer_sign='O')
 
 # In[ ]:
 
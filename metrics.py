@@ -0,0 +1,131 @@
+import os
+import sys
+from contextlib import contextmanager
+from time import perf_counter
+
+
+class Summary(object):
+    """Количество, сумма и максимум наблюдаемой величины (размеры пулов, время фаз)"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self):
+        return self.total / float(self.count) if self.count else 0.0
+
+
+class Metrics(object):
+    """Счётчики и таймеры горячих путей: попытки и перезапуски расстановки,
+    выстрелы, попадания, потопления, размеры пулов клеток и время фаз игры.
+    Накопители из разных процессов объединяются через merge"""
+    enabled = True
+
+    def __init__(self):
+        self.counters = {}
+        self.summaries = {}
+        self.phases = {}
+
+    def incr(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        summary = self.summaries.get(name)
+        if summary is None:
+            summary = self.summaries[name] = Summary()
+        summary.add(value)
+
+    @contextmanager
+    def timer(self, phase):
+        """Время блока with прибавляется к фазе phase (setup, play, stats)"""
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            summary = self.phases.get(phase)
+            if summary is None:
+                summary = self.phases[phase] = Summary()
+            summary.add(perf_counter() - started)
+
+    def merge(self, other):
+        if not other.enabled:
+            return
+        for name, value in other.counters.items():
+            self.incr(name, value)
+        for own, others in ((self.summaries, other.summaries), (self.phases, other.phases)):
+            for name, summary in others.items():
+                own.setdefault(name, Summary()).merge(summary)
+
+    def to_prometheus(self, prefix='seabattle'):
+        """Текстовый формат Prometheus (exposition format 0.0.4)"""
+        lines = []
+        for name, value in sorted(self.counters.items()):
+            metric = '%s_%s_total' % (prefix, name)
+            lines += ['# TYPE %s counter' % metric, '%s %s' % (metric, value)]
+        for name, summary in sorted(self.summaries.items()):
+            metric = '%s_%s' % (prefix, name)
+            lines += ['# TYPE %s summary' % metric,
+                      '%s_count %s' % (metric, summary.count),
+                      '%s_sum %s' % (metric, summary.total),
+                      '# TYPE %s_max gauge' % metric,
+                      '%s_max %s' % (metric, summary.max)]
+        if self.phases:
+            metric = '%s_phase_seconds' % prefix
+            lines.append('# TYPE %s summary' % metric)
+            for phase, summary in sorted(self.phases.items()):
+                lines += ['%s_count{phase="%s"} %s' % (metric, phase, summary.count),
+                          '%s_sum{phase="%s"} %.6f' % (metric, phase, summary.total)]
+        return '\n'.join(lines) + '\n'
+
+
+class _NullTimer(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class NullMetrics(Metrics):
+    """Выключенная инструментация: все методы ничего не делают"""
+    enabled = False
+    _timer = _NullTimer()
+
+    def incr(self, name, value=1):
+        pass
+
+    def observe(self, name, value):
+        pass
+
+    def timer(self, phase):
+        return self._timer
+
+    def merge(self, other):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+def export(metrics, path):
+    """Записывает метрики в файл path для сборщика (textfile), '-' - в stdout"""
+    if path == '-':
+        sys.stdout.write(metrics.to_prometheus())
+        return
+    # Сборщик не должен увидеть файл записанным наполовину
+    with open(path + '.tmp', 'w') as metrics_file:
+        metrics_file.write(metrics.to_prometheus())
+    os.replace(path + '.tmp', path)
@@ -0,0 +1,165 @@
+import mmap
+import os
+import struct
+from collections import namedtuple
+
+# Клетка [x, y] доски 10x10 кодируется одним байтом x * 10 + y,
+# старший бит байта хода - номер стрелявшего игрока (0 или 1)
+BOARD_SIZE = 10
+SHOOTER_BIT = 0x80
+# Запись индекса: смещение игры в файле, длина заголовка, число ходов, раунд, номер матча
+INDEX_RECORD = struct.Struct('<QIIII')
+GROW_STEP = 1 << 20
+
+PlayerRecord = namedtuple('PlayerRecord', ['name', 'ships_strategy_id', 'steps_strategy_id', 'ships'])
+GameRecord = namedtuple('GameRecord', ['round_num', 'match_num', 'players', 'moves'])
+
+
+def encode_cell(crd):
+    return crd[0] * BOARD_SIZE + crd[1]
+
+
+def decode_cell(cell):
+    return list(divmod(cell, BOARD_SIZE))
+
+
+class GameRecorder(object):
+    """Запись одной игры: расстановка флотов в заголовке и по байту на выстрел"""
+
+    def __init__(self, players):
+        """players - список PlayerRecord на момент начала игры"""
+        header = bytearray()
+        for player in players:
+            name = player.name.encode('utf-8')
+            header += struct.pack('<BBB', player.ships_strategy_id, player.steps_strategy_id, len(name)) + name
+            header.append(len(player.ships))
+            for cords in player.ships:
+                header.append(len(cords))
+                header += bytes(encode_cell(crd) for crd in cords)
+        self.header = bytes(header)
+        self.moves = bytearray()
+
+    def add(self, shooter, crd):
+        self.moves.append(shooter * SHOOTER_BIT | encode_cell(crd))
+
+    def to_bytes(self):
+        return self.header + bytes(self.moves)
+
+
+class ReplayWriter(object):
+    """Дописывает игры в отображённый в память файл path, индекс - в path + '.idx'"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'a+b')
+        self.size = self.file.seek(0, os.SEEK_END)
+        self.index = open(path + '.idx', 'ab')
+        self.map = None
+        self.capacity = 0
+        self.grow(self.size + GROW_STEP)
+
+    def grow(self, capacity):
+        if self.map is not None:
+            self.map.close()
+        self.file.truncate(capacity)
+        self.capacity = capacity
+        self.map = mmap.mmap(self.file.fileno(), capacity)
+
+    def append(self, recorder, round_num=0, match_num=0):
+        data = recorder.to_bytes()
+        if self.size + len(data) > self.capacity:
+            self.grow(self.size + len(data) + GROW_STEP)
+        self.map[self.size:self.size + len(data)] = data
+        self.index.write(INDEX_RECORD.pack(self.size, len(recorder.header), len(recorder.moves),
+                                           round_num, match_num))
+        self.size += len(data)
+
+    def close(self):
+        self.map.flush()
+        self.map.close()
+        # Отрезаем незанятый запас в конце файла
+        self.file.truncate(self.size)
+        self.file.close()
+        self.index.close()
+
+
+class ReplayBuffer(object):
+    """Записи игр в памяти процесса пула, потом переносятся в ReplayWriter"""
+
+    def __init__(self):
+        self.entries = []
+
+    def append(self, recorder, round_num=0, match_num=0):
+        self.entries.append((recorder, round_num, match_num))
+
+    def write_to(self, writer):
+        for entry in self.entries:
+            writer.append(*entry)
+
+    def close(self):
+        pass
+
+
+class ReplayLog(object):
+    """Чтение записанных игр без повторной симуляции: любая игра и любой ход доступны сразу"""
+
+    def __init__(self, path):
+        with open(path + '.idx', 'rb') as index_file:
+            index_data = index_file.read()
+        self.index = [INDEX_RECORD.unpack_from(index_data, offset)
+                      for offset in range(0, len(index_data), INDEX_RECORD.size)]
+        with open(path, 'rb') as data_file:
+            self.map = mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ) if self.index else None
+
+    def __len__(self):
+        return len(self.index)
+
+    def find(self, round_num, match_num):
+        """Номер игры по раунду и номеру матча в сетке"""
+        for game_num, entry in enumerate(self.index):
+            if entry[3:] == (round_num, match_num):
+                return game_num
+        raise KeyError((round_num, match_num))
+
+    def game(self, game_num):
+        offset, header_len, move_count, round_num, match_num = self.index[game_num]
+        players = []
+        pos = offset
+        while pos < offset + header_len:
+            ships_strategy_id, steps_strategy_id, name_len = struct.unpack_from('<BBB', self.map, pos)
+            pos += 3
+            name = self.map[pos:pos + name_len].decode('utf-8')
+            pos += name_len
+            ships = []
+            ship_count = self.map[pos]
+            pos += 1
+            for _ in range(ship_count):
+                ship_len = self.map[pos]
+                ships.append([decode_cell(cell) for cell in self.map[pos + 1:pos + 1 + ship_len]])
+                pos += 1 + ship_len
+            players.append(PlayerRecord(name, ships_strategy_id, steps_strategy_id, ships))
+        moves = self.map[offset + header_len:offset + header_len + move_count]
+        return GameRecord(round_num, match_num, players, moves)
+
+    def moves(self, game_num, until=None):
+        """Ходы игры (номер стрелявшего, [x, y]), по умолчанию все"""
+        moves = self.game(game_num).moves[:until]
+        return [(move >> 7, decode_cell(move & ~SHOOTER_BIT)) for move in moves]
+
+    def state_at(self, game_num, move_num):
+        """Положение после move_num ходов: для каждого игрока - клетки, по которым он
+        стрелял, попадания и число потопленных кораблей соперника"""
+        record = self.game(game_num)
+        shots = [[], []]
+        hits = [[], []]
+        for shooter, crd in self.moves(game_num, move_num):
+            shots[shooter].append(crd)
+            if any(crd in cords for cords in record.players[1 - shooter].ships):
+                hits[shooter].append(crd)
+        sunk = [sum(all(crd in hits[shooter] for crd in cords) for cords in record.players[1 - shooter].ships)
+                for shooter in range(2)]
+        return shots, hits, sunk
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
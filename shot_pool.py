@@ -0,0 +1,63 @@
+from collections import deque
+from random import randrange
+
+
+class ShotPool(object):
+    """Клетки, в которые ещё можно стрелять. Хранятся в массиве с индексом
+    позиций: выбор случайной клетки без возвращения и удаление любой клетки
+    (например, ореола потопленного корабля) стоят O(1) - удаляемая клетка
+    меняется местами с последней. Отдельная очередь priority хранит клетки,
+    которые нужно проверить в первую очередь (добивание корабля)."""
+
+    def __init__(self, cells=()):
+        self.cells = []
+        self.position = {}
+        self.priority = deque()
+        for cell in cells:
+            self.add(cell)
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __contains__(self, cell):
+        return cell in self.position
+
+    def add(self, cell):
+        if cell not in self.position:
+            self.position[cell] = len(self.cells)
+            self.cells.append(cell)
+
+    def discard(self, cell):
+        ind = self.position.pop(cell, None)
+        if ind is None:
+            return
+        last = self.cells.pop()
+        if ind < len(self.cells):
+            self.cells[ind] = last
+            self.position[last] = ind
+
+    def sample(self):
+        """Случайная клетка, которая сразу удаляется из пула"""
+        cell = self.cells[randrange(len(self.cells))]
+        self.discard(cell)
+        return cell
+
+    def push_priority(self, cell):
+        if cell in self.position:
+            self.priority.append(cell)
+
+    def pop_priority(self):
+        """Первая ещё доступная клетка из очереди приоритетных, None - если их нет"""
+        while self.priority:
+            cell = self.priority.popleft()
+            if cell in self.position:
+                self.discard(cell)
+                return cell
+        return None
+
+    def pop(self):
+        """Приоритетная клетка, а если их нет - случайная"""
+        cell = self.pop_priority()
+        if cell is None:
+            cell = self.sample()
+        return cell
@@ -0,0 +1,198 @@
+import csv
+import json
+import struct
+from array import array
+
+
+class RunningStat(object):
+    """Среднее и дисперсия в один проход (алгоритм Уэлфорда)"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other):
+        """Объединяет накопители, посчитанные отдельно (формула Чана)"""
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return self.variance ** 0.5
+
+
+class StepHistogram(object):
+    """Гистограмма количества ходов с корзинами ширины bin_width"""
+
+    def __init__(self, bin_width=10):
+        self.bin_width = bin_width
+        self.counts = {}
+
+    def add(self, value):
+        key = value // self.bin_width * self.bin_width
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def merge(self, other):
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+
+    def items(self):
+        return sorted(self.counts.items())
+
+
+class GroupStats(object):
+    """Накопители одной группы записей: ходы, очки и гистограмма ходов"""
+
+    def __init__(self, bin_width=10):
+        self.steps = RunningStat()
+        self.score = RunningStat()
+        self.histogram = StepHistogram(bin_width)
+
+    def add(self, steps, score):
+        self.steps.add(steps)
+        self.score.add(score)
+        self.histogram.add(steps)
+
+    def merge(self, other):
+        self.steps.merge(other.steps)
+        self.score.merge(other.score)
+        self.histogram.merge(other.histogram)
+
+
+class StreamingStats(object):
+    """Потоковая статистика турнира: обновляется по мере окончания игр.
+    Группы: ('all',), ('won', флаг), ('ships_strategy', id, флаг), ('steps_strategy', id, флаг)"""
+
+    def __init__(self, bin_width=10):
+        self.bin_width = bin_width
+        self.groups = {}
+
+    def group(self, key):
+        if key not in self.groups:
+            self.groups[key] = GroupStats(self.bin_width)
+        return self.groups[key]
+
+    def add(self, steps, score, won, ships_strategy_id, steps_strategy_id):
+        won = bool(won)
+        for key in [('all',), ('won', won), ('ships_strategy', ships_strategy_id, won),
+                    ('steps_strategy', steps_strategy_id, won)]:
+            self.group(key).add(steps, score)
+
+    def merge(self, other):
+        for key, group in other.groups.items():
+            self.group(key).merge(group)
+
+    def report(self):
+        """Текущие значения в виде словаря: группа -> (число записей, среднее и ст. отклонение ходов, среднее очков)"""
+        return dict((key, (group.steps.count, group.steps.mean, group.steps.std, group.score.mean))
+                    for key, group in self.groups.items())
+
+
+def wilson_interval(wins, games, z=1.96):
+    """Доверительный интервал Уилсона для доли побед wins из games (z=1.96 - 95%)"""
+    if not games:
+        return 0.0, 1.0
+    rate = wins / float(games)
+    denominator = 1 + z * z / games
+    center = (rate + z * z / (2 * games)) / denominator
+    half_width = z * (rate * (1 - rate) / games + z * z / (4 * games * games)) ** 0.5 / denominator
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+
+class CsvGameWriter(object):
+    """Пишет построчные записи в CSV пачками по batch_size строк"""
+
+    def __init__(self, path, columns, batch_size=4096):
+        self.columns = [column for column, typecode in columns]
+        self.batch_size = batch_size
+        self.rows = []
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.columns)
+
+    def write(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        self.writer.writerows(self.rows)
+        self.rows = []
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class ChunkedColumnWriter(object):
+    """Колоночный бинарный файл из блоков (по образцу row group в Parquet).
+    Формат: MAGIC, длина и JSON-описание колонок, затем блоки:
+    число строк (uint32) и подряд байты каждой колонки в порядке описания"""
+    MAGIC = b'SBCOL1\n'
+
+    def __init__(self, path, columns, batch_size=65536):
+        self.columns = list(columns)
+        self.batch_size = batch_size
+        self.file = open(path, 'wb')
+        header = json.dumps(self.columns).encode('utf-8')
+        self.file.write(self.MAGIC + struct.pack('<I', len(header)) + header)
+        self.reset_chunk()
+
+    def reset_chunk(self):
+        self.chunk = [array(typecode) for column, typecode in self.columns]
+
+    def write(self, row):
+        for values, value in zip(self.chunk, row):
+            values.append(value)
+        if len(self.chunk[0]) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not len(self.chunk[0]):
+            return
+        self.file.write(struct.pack('<I', len(self.chunk[0])))
+        for values in self.chunk:
+            self.file.write(values.tobytes())
+        self.file.flush()
+        self.reset_chunk()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def read_column_chunks(path):
+    """Читает файл ChunkedColumnWriter, отдаёт блоки в виде словарей колонка -> array"""
+    with open(path, 'rb') as column_file:
+        if column_file.read(len(ChunkedColumnWriter.MAGIC)) != ChunkedColumnWriter.MAGIC:
+            raise ValueError(u'Неизвестный формат файла: %s' % path)
+        header_len, = struct.unpack('<I', column_file.read(4))
+        columns = json.loads(column_file.read(header_len).decode('utf-8'))
+        while True:
+            size = column_file.read(4)
+            if not size:
+                break
+            rows, = struct.unpack('<I', size)
+            chunk = {}
+            for column, typecode in columns:
+                values = array(typecode)
+                values.frombytes(column_file.read(rows * values.itemsize))
+                chunk[column] = values
+            yield chunk
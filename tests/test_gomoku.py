@@ -0,0 +1,54 @@
+import random
+
+import gomoku
+
+
+def scan_threats(board, sign, missing):
+    # The full scan over every segment that threats() replaces
+    other = 'O' if sign == 'X' else 'X'
+    cells = set()
+    for segment, cells_in_segment in enumerate(board.segments):
+        if board.counts[sign][segment] == board.k - missing and board.counts[other][segment] == 0:
+            cells.update(index for index in cells_in_segment if board.cells[index] == ' ')
+    return cells
+
+
+def check_threats(board):
+    for sign in ('X', 'O'):
+        for missing in range(board.k + 1):
+            assert board.threats(sign, missing) == scan_threats(board, sign, missing)
+
+
+def test_threats_match_full_scan():
+    rnd = random.Random(5)
+    for size, k in [(3, 3), (7, 4), (9, 5)]:
+        board = gomoku.LineBoard(size, k)
+        order = list(range(size * size))
+        rnd.shuffle(order)
+        sign = 'X'
+        for index in order:
+            board.move(index, sign)
+            check_threats(board)
+            if board.winner:
+                break
+            if rnd.random() < 0.3:
+                board.undo()
+                check_threats(board)
+                board.move(index, sign)
+                if board.winner:
+                    break
+            sign = 'O' if sign == 'X' else 'X'
+        while board.moves:
+            board.undo()
+            check_threats(board)
+
+
+def test_play_game_asks_again_on_bad_input(monkeypatch, capsys):
+    answers = iter(['a b', '1', '-1 0', '0 3', '0 0', '0 0', '1 0', '0 1', '1 1', '0 2'])
+    monkeypatch.setattr('builtins.input', lambda prompt='': next(answers))
+    gomoku.play_game(3, 3)
+    out = capsys.readouterr().out
+    assert out.count('Enter two numbers') == 2
+    assert out.count('must be between') == 2
+    assert 'already taken' in out
+    assert 'We have a winner:X' in out
@@ -0,0 +1,38 @@
+import importlib
+
+import pytest
+
+import homework_play_game
+import tictactoe_ai
+
+
+@pytest.fixture
+def table_path(tmp_path, monkeypatch):
+    path = str(tmp_path / 'table.bin')
+    monkeypatch.setattr(tictactoe_ai, 'DEFAULT_TABLE_PATH', path)
+    yield path
+    if tictactoe_ai.outcome_table is not None:
+        tictactoe_ai.outcome_table.close()
+    tictactoe_ai.outcome_table = None
+
+
+def test_game_uses_prebuilt_table(table_path):
+    tictactoe_ai.build_table(table_path)
+    tictactoe_ai.outcome_table = None
+    importlib.reload(homework_play_game)
+    assert tictactoe_ai.outcome_table is not None
+    board = ['X', ' ', ' ', ' ', 'O', ' ', ' ', ' ', ' ']
+    table_move = homework_play_game.best_move(board)
+    tictactoe_ai.outcome_table.close()
+    tictactoe_ai.outcome_table = None
+    assert table_move == tictactoe_ai.best_move(board)
+
+
+def test_game_falls_back_to_search(table_path):
+    importlib.reload(homework_play_game)
+    assert tictactoe_ai.outcome_table is None
+    with open(table_path, 'wb') as table_file:
+        table_file.write(b'not a table')
+    importlib.reload(homework_play_game)
+    assert tictactoe_ai.outcome_table is None
+    assert homework_play_game.best_move([' '] * 9) is not None
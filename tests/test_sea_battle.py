@@ -0,0 +1,99 @@
+import copy
+import pickle
+
+
+def test_dot_copy_and_pickle(sea):
+    dot = sea.Dot(2, 3)
+    for clone in (copy.copy(dot), copy.deepcopy(dot), pickle.loads(pickle.dumps(dot))):
+        assert clone == dot
+        assert hash(clone) == hash(dot)
+        assert isinstance(clone, sea.Dot)
+
+
+def test_ship_and_board_deepcopy(sea):
+    ship = sea.Ship(2, sea.Dot(0, 0), 0)
+    clone = copy.deepcopy(ship)
+    assert clone.dots == ship.dots
+    board = sea.Board(sea.NullSink())
+    board.add_ship(ship)
+    assert copy.deepcopy(board.ships)[0].dots == ship.dots
+
+
+def board_state(board):
+    return [row[:] for row in board.table], set(board.locked_dots)
+
+
+def test_bit_board_mark_oreol_matches_board(sea):
+    placed = sea.Ship(2, sea.Dot(0, 0), 0)
+    # Корабли, которых нет на доске: ореол всё равно их собственный
+    others = [sea.Ship(1, sea.Dot(4, 4), 0), sea.Ship(3, sea.Dot(2, 3), 1), sea.Ship(2, sea.Dot(5, 0), 1)]
+    for ship in others:
+        boards = []
+        for cls in (sea.Board, sea.BitBoard):
+            board = cls(sea.NullSink())
+            board.add_ship(sea.Ship(placed.length, placed.bow, placed.direction))
+            board.mark_oreol(sea.Ship(ship.length, ship.bow, ship.direction), is_game=True)
+            boards.append(board_state(board))
+        assert boards[0] == boards[1]
+
+
+def test_bit_board_game_matches_board(sea):
+    ships = [sea.Ship(3, sea.Dot(0, 0), 1), sea.Ship(2, sea.Dot(2, 2), 0), sea.Ship(1, sea.Dot(5, 5), 0)]
+    boards = []
+    for cls in (sea.Board, sea.BitBoard):
+        board = cls(sea.NullSink())
+        for ship in ships:
+            board.add_ship(sea.Ship(ship.length, ship.bow, ship.direction))
+        board.get_ready()
+        for dot in [sea.Dot(0, 0), sea.Dot(0, 1), sea.Dot(0, 2), sea.Dot(5, 5), sea.Dot(3, 3)]:
+            try:
+                board.shot(dot)
+            except sea.BoardUsedException:
+                pass
+        boards.append((board_state(board), board.live_ships))
+    assert boards[0] == boards[1]
+
+
+def test_server_survives_long_and_blank_lines(sea):
+    import asyncio
+
+    async def scenario():
+        server = sea.GameServer(metrics=sea.Metrics())
+        listener = await server.start()
+        port = listener.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        assert await reader.readline() == f'READY {sea.BOARD_SIZE}\n'.encode()
+        assert await reader.readline() == b'TURN\n'
+        writer.write(b'1' * (1 << 17) + b'\n')
+        await writer.drain()
+        assert (await reader.readline()).startswith(b'ERROR')
+        writer.write(b'\n')
+        await writer.drain()
+        assert (await reader.readline()).startswith(b'ERROR')
+        writer.write(b'1 1\n')
+        await writer.drain()
+        reply = await reader.readline()
+        assert reply.split()[0] in (b'MISS', b'HIT', b'KILL')
+        writer.write(b'QUIT\n')
+        await writer.drain()
+        writer.close()
+        listener.close()
+        await listener.wait_closed()
+        return server
+
+    server = asyncio.run(scenario())
+    assert server.metrics.counters['shots'] >= 1
+
+
+def test_server_slow_ai_metrics(sea):
+    import asyncio
+
+    async def scenario():
+        server = sea.GameServer(ai_cls=sea.DensityAI, metrics=sea.Metrics())
+        await sea.load_test(20, 5, server=server)
+        return server
+
+    server = asyncio.run(scenario())
+    assert server.finished == 20
+    assert server.metrics.counters['shots'] > 0
+    assert server.metrics.summaries['shot_pool_size'].count > 0
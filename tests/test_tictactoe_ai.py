@@ -0,0 +1,28 @@
+import pytest
+
+import homework_play_game
+import tictactoe_ai
+
+np = pytest.importorskip('numpy')
+
+
+def test_get_winners_matches_get_winner():
+    boards = [board[:] for board in tictactoe_ai.reachable_positions()]
+    winners = tictactoe_ai.get_winners(tictactoe_ai.boards_to_array(boards))
+    codes = {'': 0, 'X': 1, 'O': 2}
+    expected = [codes[homework_play_game.get_winner(board, homework_play_game.winning_combinations)]
+                for board in boards]
+    assert winners.tolist() == expected
+
+
+def test_get_winners_empty():
+    for boards in ([], np.zeros((0, 9), dtype=np.int8)):
+        winners = tictactoe_ai.get_winners(boards)
+        assert winners.shape == (0,)
+        assert winners.dtype == np.int8
+
+
+def test_get_winners_single_flat_board():
+    board = [1, 1, 1, 2, 2, 0, 0, 0, 0]
+    assert tictactoe_ai.get_winners(board).tolist() == [1]
+    assert tictactoe_ai.get_winners(np.array(board, dtype=np.int8)).tolist() == [1]
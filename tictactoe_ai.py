@@ -0,0 +1,247 @@
+"""Perfect-play opponent for the tic-tac-toe game in homework_play_game.py.
+
+The board is the same list of nine cells (' ', 'X' or 'O'). Every position
+is identified by its base-3 code (' ' = 0, 'X' = 1, 'O' = 2, cell i is
+digit i), and solved positions are kept in a transposition table keyed by
+that code, so each of the reachable positions is searched at most once.
+
+`python tictactoe_ai.py build [path]` writes every reachable position into
+a flat binary table (see OutcomeTable) that is memory-mapped at runtime.
+"""
+import mmap
+import os
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SIGNS = {' ': 0, 'X': 1, 'O': 2}
+WINNING_LINES = [(0, 1, 2), (3, 4, 5), (6, 7, 8), (0, 3, 6), (1, 4, 7), (2, 5, 8), (0, 4, 8), (2, 4, 6)]
+# Lines through every cell, to check only the last move
+CELL_LINES = [[line for line in WINNING_LINES if i in line] for i in range(9)]
+# Center, corners, edges: good moves first make alpha-beta cut more
+MOVE_ORDER = [4, 0, 2, 6, 8, 1, 3, 5, 7]
+POWERS = [3 ** i for i in range(9)]
+INF = 100
+
+EXACT, LOWER, UPPER = 0, 1, 2
+
+# code -> (value, flag) for the side to move
+transposition_table = {}
+# code -> best move for the side to move
+best_moves = {}
+# OutcomeTable used by best_move instead of searching, see use_table()
+outcome_table = None
+
+
+def encode(board):
+    code = 0
+    for i, cell in enumerate(board):
+        code += SIGNS[cell] * POWERS[i]
+    return code
+
+
+def side_to_move(cells):
+    return 1 if cells.count(1) == cells.count(2) else 2
+
+
+def _is_win(cells, index):
+    side = cells[index]
+    for x, y, z in CELL_LINES[index]:
+        if cells[x] == cells[y] == cells[z] == side:
+            return True
+    return False
+
+
+def _negamax(cells, code, side, last_move, alpha, beta):
+    # Value for `side`, who is to move: a win is worth more the sooner it comes
+    empties = cells.count(0)
+    if last_move is not None and _is_win(cells, last_move):
+        return -(1 + empties)
+    if empties == 0:
+        return 0
+    alpha_orig = alpha
+    entry = transposition_table.get(code)
+    if entry is not None:
+        value, flag = entry
+        if flag == EXACT:
+            return value
+        if flag == LOWER:
+            alpha = max(alpha, value)
+        else:
+            beta = min(beta, value)
+        if alpha >= beta:
+            return value
+    best = -INF
+    for index in MOVE_ORDER:
+        if cells[index]:
+            continue
+        cells[index] = side
+        value = -_negamax(cells, code + side * POWERS[index], 3 - side, index, -beta, -alpha)
+        cells[index] = 0
+        if value > best:
+            best = value
+        if best > alpha:
+            alpha = best
+        if alpha >= beta:
+            break
+    if best <= alpha_orig:
+        flag = UPPER
+    elif best >= beta:
+        flag = LOWER
+    else:
+        flag = EXACT
+    transposition_table[code] = (best, flag)
+    return best
+
+
+def _solve(cells, code):
+    # Best move and its exact value for the side to move
+    move = best_moves.get(code)
+    if move is not None:
+        return move
+    side = side_to_move(cells)
+    best_value = -INF
+    for index in MOVE_ORDER:
+        if cells[index]:
+            continue
+        cells[index] = side
+        value = -_negamax(cells, code + side * POWERS[index], 3 - side, index, -INF, INF)
+        cells[index] = 0
+        if value > best_value:
+            best_value, move = value, index
+    best_moves[code] = move
+    transposition_table[code] = (best_value, EXACT)
+    return move
+
+
+def best_move(board):
+    """Index of the best cell for the side to move ('X' moves first).
+    Returns None if the game is already over."""
+    if outcome_table is not None:
+        return outcome_table.best_move(board)
+    cells = [SIGNS[cell] for cell in board]
+    if 0 not in cells or any(cells[x] and cells[x] == cells[y] == cells[z] for x, y, z in WINNING_LINES):
+        return None
+    return _solve(cells, encode(board))
+
+
+def position_value(board):
+    """Game-theoretic value for the side to move: 1 win, 0 draw, -1 loss."""
+    cells = [SIGNS[cell] for cell in board]
+    for x, y, z in WINNING_LINES:
+        if cells[x] and cells[x] == cells[y] == cells[z]:
+            return -1
+    if 0 not in cells:
+        return 0
+    _solve(cells, encode(board))
+    value = transposition_table[encode(board)][0]
+    return (value > 0) - (value < 0)
+
+
+# Outcome table: TABLE_MAGIC, then one byte per base-3 code.
+# Low 4 bits - best move (NO_MOVE if the game is over), high 4 bits - value
+# for the side to move + 1 (0 loss, 1 draw, 2 win); UNREACHABLE for other codes.
+TABLE_MAGIC = b'TTT1'
+TABLE_SIZE = 3 ** 9
+NO_MOVE = 15
+UNREACHABLE = 0xFF
+DEFAULT_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tictactoe_table.bin')
+
+
+def reachable_positions():
+    """Every position reachable from the empty board, as lists of cells"""
+    seen = set()
+    stack = [[' '] * 9]
+    while stack:
+        board = stack.pop()
+        code = encode(board)
+        if code in seen:
+            continue
+        seen.add(code)
+        yield board
+        if best_move(board) is None:
+            continue
+        sign = 'X' if board.count('X') == board.count('O') else 'O'
+        for index in range(9):
+            if board[index] == ' ':
+                child = board[:]
+                child[index] = sign
+                stack.append(child)
+
+
+def build_table(path=DEFAULT_TABLE_PATH):
+    global outcome_table
+    outcome_table = None
+    table = bytearray([UNREACHABLE]) * TABLE_SIZE
+    for board in reachable_positions():
+        move = best_move(board)
+        table[encode(board)] = (position_value(board) + 1) << 4 | (NO_MOVE if move is None else move)
+    with open(path, 'wb') as table_file:
+        table_file.write(TABLE_MAGIC + table)
+    return path
+
+
+class OutcomeTable(object):
+    """Read-only memory-mapped table written by build_table: every lookup is one byte read"""
+
+    def __init__(self, path=DEFAULT_TABLE_PATH):
+        with open(path, 'rb') as table_file:
+            self.data = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(TABLE_MAGIC)] != TABLE_MAGIC or len(self.data) != len(TABLE_MAGIC) + TABLE_SIZE:
+            self.data.close()
+            raise ValueError(f'{path} is not a tic-tac-toe outcome table')
+
+    def lookup(self, board):
+        """(best move or None, value for the side to move: 1 win, 0 draw, -1 loss)"""
+        entry = self.data[len(TABLE_MAGIC) + encode(board)]
+        if entry == UNREACHABLE:
+            raise ValueError('Position is not reachable in a legal game')
+        move = entry & 0x0F
+        return (None if move == NO_MOVE else move), (entry >> 4) - 1
+
+    def best_move(self, board):
+        return self.lookup(board)[0]
+
+    def close(self):
+        self.data.close()
+
+
+def use_table(path=DEFAULT_TABLE_PATH):
+    """Makes best_move answer from the prebuilt table at path"""
+    global outcome_table
+    outcome_table = OutcomeTable(path)
+    return outcome_table
+
+
+def boards_to_array(boards):
+    """(M, 9) int8 array from a list of boards, cells coded as in SIGNS"""
+    if np is None:
+        raise ImportError('boards_to_array needs numpy')
+    return np.array([[SIGNS[cell] for cell in board] for board in boards], dtype=np.int8)
+
+
+def get_winners(boards):
+    """Winners of M boards at once: boards is an (M, 9) int8 array coded as in SIGNS
+    (a single flat board of 9 cells is a batch of one), the result is an (M,) int8
+    array with 0 (no winner), 1 ('X') or 2 ('O').
+    Like get_winner, the first winning line in WINNING_LINES order decides."""
+    if np is None:
+        raise ImportError('get_winners needs numpy')
+    boards = np.asarray(boards, dtype=np.int8).reshape(-1, 9)
+    if not len(boards):
+        return np.zeros(0, dtype=np.int8)
+    lines = boards[:, np.array(WINNING_LINES)]
+    first = lines[:, :, 0]
+    won = (first != 0) & (first == lines[:, :, 1]) & (first == lines[:, :, 2])
+    line = won.argmax(axis=1)
+    return np.where(won.any(axis=1), first[np.arange(len(boards)), line], 0).astype(np.int8)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) >= 2 and sys.argv[1] == 'build':
+        print(f'Table written to {build_table(*sys.argv[2:3])}')
+    else:
+        print(f'Usage: {sys.argv[0]} build [path]')